@@ -0,0 +1,110 @@
+"""Peak memory of FinanceScoreCalculator.calculate(), default vs projection mode.
+
+Builds a synthetic frame shaped like the extractor's output (ids, text
+occupation and dob, amounts; optionally the compact schema) and measures the
+tracemalloc peak of one calculate() call per mode, relative to the input
+frame's own size. The run fails (exit code 1) when the projection-mode peak
+exceeds the ceiling, so it guards the memory ceiling in CI.
+
+Measured peaks (x input size; the same at 50k and 200k rows):
+
+    input           default   projection   default ceiling
+    plain frame      2.96x       1.13x          1.25x
+    --compact        8.27x       3.79x          4.0x
+
+The compact input is about 3.5x smaller, hence the higher ratios. Each
+ceiling sits just above the projection measurement, so a change that brings
+back a full-frame copy fails the run. --max-peak-ratio overrides it.
+
+Usage:
+    python benchmark_calculate_memory.py --rows 200000 [--compact] [--max-peak-ratio 1.25]
+"""
+
+import argparse
+import gc
+import logging
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+
+try:
+    from data_extraction import apply_finance_schema
+    from finance_score_engine import FinanceScoreCalculator
+except ImportError:
+    from .data_extraction import apply_finance_schema
+    from .finance_score_engine import FinanceScoreCalculator
+
+
+# Projection-mode peak ceilings (x input size), just above the measurements above
+MAX_PEAK_RATIO = 1.25
+MAX_PEAK_RATIO_COMPACT = 4.0
+
+
+def build_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic extractor output: one proposal per row, amounts with some gaps."""
+    rng = np.random.default_rng(seed)
+    income = rng.uniform(2e5, 5e6, rows).round(2)
+    income[rng.random(rows) < 0.02] = np.nan
+    return pd.DataFrame({
+        'proposal_number': np.arange(1, rows + 1),
+        'proposer_id': np.arange(1, rows + 1),
+        'stated_age': rng.integers(18, 70, rows),
+        'dob': pd.Series(pd.Timestamp('1960-01-01') + pd.to_timedelta(rng.integers(0, 15000, rows), unit='D')).dt.strftime('%Y-%m-%d'),
+        'occupation': rng.choice(['salaried', 'self employed', 'doctor', 'student', ''], rows),
+        'annual_income': income,
+        'premium': rng.uniform(5e3, 1e5, rows).round(2),
+        'sum_assured': rng.uniform(1e5, 1e7, rows).round(2),
+        'other_insurance_sum_assured': rng.uniform(0, 5e6, rows).round(2),
+    })
+
+
+def measure(df: pd.DataFrame, projection: bool):
+    """Return (peak bytes above the baseline, seconds, result columns) for one calculate()."""
+    calculator = FinanceScoreCalculator(projection=projection)
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    result = calculator.calculate(df)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return peak, elapsed, len(result.columns)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--compact', action='store_true', help='apply FINANCE_SCHEMA to the input frame')
+    parser.add_argument('--max-peak-ratio', type=float, default=None,
+                        help=f'fail when the projection peak exceeds this multiple of the input size '
+                             f'(default {MAX_PEAK_RATIO:g}, {MAX_PEAK_RATIO_COMPACT:g} with --compact)')
+    args = parser.parse_args(argv)
+    if args.max_peak_ratio is None:
+        args.max_peak_ratio = MAX_PEAK_RATIO_COMPACT if args.compact else MAX_PEAK_RATIO
+
+    df = build_frame(args.rows)
+    if args.compact:
+        df = apply_finance_schema(df)
+    input_bytes = df.memory_usage(deep=True).sum()
+    print(f"input: {args.rows} rows, {input_bytes / 1e6:.1f} MB")
+    print(f"{'mode':>10} {'peak MB':>9} {'x input':>8} {'seconds':>8} {'columns':>8}")
+    ratios = {}
+    for projection in (False, True):
+        peak, seconds, columns = measure(df, projection)
+        mode = 'projection' if projection else 'default'
+        ratios[mode] = peak / input_bytes
+        print(f"{mode:>10} {peak / 1e6:>9.1f} {ratios[mode]:>8.2f} {seconds:>8.2f} {columns:>8}")
+    if ratios['projection'] > args.max_peak_ratio:
+        print(f"projection peak {ratios['projection']:.2f}x input exceeds the {args.max_peak_ratio:g}x ceiling", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,33 +2,163 @@
 """
 Single Finance Score Calculator
 
-This script calculates the finance score for a single proposer using the existing
-finance score engine. It reads input data from environment variables and outputs
-the calculated score as JSON.
+This script calculates the finance score for a single proposer using the
+compiled finance score rules. It reads input data from environment variables and
+outputs the calculated score as JSON. Scoring goes through the pandas-free scalar
+path (finance_scalar), so the script never imports pandas.
+
+With --batch it scores many proposers in one invocation: records are read as a
+JSON array or NDJSON from stdin or --input, scored in a single vectorized
+FinanceScoreCalculator.calculate call, and written to stdout as NDJSON in input
+order, one {"index", "result"} or {"index", "error"} object per record.
 """
 
 import os
 import sys
 import json
-import pandas as pd
+import math
 import logging
+import argparse
 from datetime import datetime
 
 # Add the current directory to Python path to import local modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from finance_score_engine import FinanceScoreCalculator
+    from finance_scalar import score_proposal
 except ImportError as e:
-    print(f"Error importing FinanceScoreCalculator: {e}", file=sys.stderr)
+    print(f"Error importing finance_scalar: {e}", file=sys.stderr)
     sys.exit(1)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
 logger = logging.getLogger(__name__)
 
+REQUIRED_FIELDS = ['proposal_number', 'proposer_id', 'annual_income', 'premium', 'sum_assured']
+
+
+def score_finance_data(finance_data, ruleset=None):
+    """Score one proposer's finance data and return the response dict.
+
+    Raises ValueError when required fields are missing. ``ruleset`` defaults to
+    the cached compile of the configured rules file. Shared by this CLI and the
+    persistent finance_score_worker.
+    """
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in finance_data or finance_data[field] is None]
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {missing_fields}")
+
+    response = score_proposal(finance_data, ruleset)
+    response["calculated_at"] = datetime.now().isoformat()
+    return response
+
+
+def read_batch_records(stream):
+    """Parse a JSON array or NDJSON stream into (record, error) pairs in input order."""
+    text = stream.read()
+    if text.lstrip().startswith('['):
+        records = json.loads(text)
+        return [(r, None) if isinstance(r, dict) else (None, "Record is not a JSON object") for r in records]
+    entries = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            entries.append((None, f"Invalid JSON on line {line_no}: {e}"))
+            continue
+        entries.append((record, None) if isinstance(record, dict) else (None, f"Line {line_no} is not a JSON object"))
+    return entries
+
+
+def _json_safe(value):
+    """Map NaN and pandas/NumPy scalars to plain JSON values."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+def score_batch(entries):
+    """Yield ({"index", "result"} | {"index", "error"}) dicts for parsed batch entries.
+
+    Valid records are scored together in one vectorized calculate() call; records
+    that fail validation, or the whole batch if that call raises, are reported or
+    rescored per record so one bad proposal never aborts the rest.
+    """
+    import pandas as pd
+    from finance_score_engine import FinanceScoreCalculator
+
+    outcomes = {}
+    valid = {}
+    for index, (record, error) in enumerate(entries):
+        if error is None:
+            missing_fields = [field for field in REQUIRED_FIELDS if field not in record or record[field] is None]
+            if missing_fields:
+                error = f"Missing required fields: {missing_fields}"
+        if error is None:
+            valid[index] = record
+        else:
+            outcomes[index] = {"index": index, "error": error}
+
+    calculated_at = datetime.now().isoformat()
+    if valid:
+        try:
+            # Batch-invariant, so each result matches the single-score response for that record alone
+            calculator = FinanceScoreCalculator(batch_invariant=True)
+            result_df = calculator.calculate(pd.DataFrame(list(valid.values()), index=list(valid.keys())))
+            # iter_records expands score_factors, which calculate() leaves compact by default
+            for index, (_, result) in zip(result_df.index, calculator.iter_records(result_df)):
+                result["calculated_at"] = calculated_at
+                outcomes[index] = {"index": index, "result": result}
+        except Exception as e:
+            logger.error(f"Vectorized batch scoring failed, scoring records individually: {e}", exc_info=True)
+            for index, record in valid.items():
+                try:
+                    outcomes[index] = {"index": index, "result": score_finance_data(record)}
+                except Exception as record_error:
+                    outcomes[index] = {"index": index, "error": str(record_error)}
+
+    for index in range(len(entries)):
+        yield outcomes[index]
+
+
+def run_batch(input_path):
+    """Score a batch file (or stdin for "-") and stream NDJSON results to stdout."""
+    try:
+        if input_path == '-':
+            entries = read_batch_records(sys.stdin)
+        else:
+            with open(input_path, 'r', encoding='utf-8') as fh:
+                entries = read_batch_records(fh)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Failed to read batch input: {e}")
+        print(json.dumps({"error": f"Failed to read batch input: {e}"}), file=sys.stderr)
+        return 1
+
+    logger.info(f"Calculating finance scores for a batch of {len(entries)} records")
+    errors = 0
+    for outcome in score_batch(entries):
+        errors += 'error' in outcome
+        sys.stdout.write(json.dumps(_json_safe(outcome), default=lambda o: o.item() if hasattr(o, 'item') else None) + '\n')
+    sys.stdout.flush()
+    logger.info(f"Batch completed: {len(entries) - errors} scored, {errors} failed")
+    return 0
+
+
 def main():
-    """Calculate finance score for a single proposer."""
+    """Calculate finance score for a single proposer, or a batch with --batch."""
+    parser = argparse.ArgumentParser(description="Calculate finance scores for one proposer (FINANCE_DATA) or a batch")
+    parser.add_argument('--batch', action='store_true', help="Score a JSON array or NDJSON of records and emit NDJSON")
+    parser.add_argument('--input', default='-', help="Batch input file; '-' (default) reads stdin")
+    args = parser.parse_args()
+    if args.batch:
+        sys.exit(run_batch(args.input))
+
     try:
         # Get finance data from environment variable
         finance_data_json = os.environ.get('FINANCE_DATA')
@@ -47,52 +177,13 @@ def main():
 
         logger.info(f"Calculating finance score for proposer_id: {finance_data.get('proposer_id')}")
 
-        # Validate required fields
-        required_fields = ['proposal_number', 'proposer_id', 'annual_income', 'premium', 'sum_assured']
-        missing_fields = [field for field in required_fields if field not in finance_data or finance_data[field] is None]
-        
-        if missing_fields:
-            error_msg = f"Missing required fields: {missing_fields}"
-            logger.error(error_msg)
-            print(json.dumps({"error": error_msg}), file=sys.stderr)
-            sys.exit(1)
-
-        # Convert to DataFrame (single row)
-        df = pd.DataFrame([finance_data])
-        
-        # Initialize the finance score calculator
-        calculator = FinanceScoreCalculator()
-        
-        # Calculate the finance score
-        result_df = calculator.calculate(df)
-        
-        if result_df is None or result_df.empty:
-            error_msg = "Failed to calculate finance score - no results returned"
-            logger.error(error_msg)
-            print(json.dumps({"error": error_msg}), file=sys.stderr)
+        try:
+            response = score_finance_data(finance_data)
+        except ValueError as e:
+            logger.error(str(e))
+            print(json.dumps({"error": str(e)}), file=sys.stderr)
             sys.exit(1)
 
-        # Extract the result for the single row
-        result = result_df.iloc[0].to_dict()
-        
-        # Prepare the response
-        response = {
-            "proposal_number": result.get('proposal_number'),
-            "proposer_id": result.get('proposer_id'),
-            "sar_income_ratio": result.get('sar_income_ratio'),
-            "tsar_income_ratio": result.get('tsar_income_ratio'),
-            "premium_income_ratio": result.get('premium_income_ratio'),
-            "sar_score": result.get('sar_score'),
-            "tsar_score": result.get('tsar_score'),
-            "premium_score": result.get('premium_score'),
-            "final_finance_score": result.get('final_finance_score'),
-            "risk_category": result.get('risk_category'),
-            "underwriting_flag": result.get('underwriting_flag'),
-            "score_factors": result.get('score_factors'),
-            "validation_issues": result.get('validation_issues'),
-            "calculated_at": datetime.now().isoformat()
-        }
-
         # Output the result as JSON
         print(json.dumps(response, indent=2, default=str))
         logger.info(f"Finance score calculation completed successfully for proposer_id: {finance_data.get('proposer_id')}")
@@ -0,0 +1,156 @@
+"""Parity check of the pandas-free scalar path against FinanceScoreCalculator.
+
+finance_scalar.score_proposal must return, for every input, the record
+``FinanceScoreCalculator.export_per_proposal`` writes for that proposal when
+it is scored on its own. This script scores one generated case set both ways
+and compares the serialized records. The set includes:
+- randomized amounts
+- ratios on, just below and just above every band edge of the rules file
+- zero and negative incomes
+- None, NaN, Decimal, comma-formatted string and unparsable amounts
+
+Each case goes through the engine twice:
+- in a one-row frame, as the single-score path sees it;
+- inside one batch-invariant frame with all the others, as the pipeline
+  scores it.
+
+Exits 1 on any mismatch, so it can run in CI next to rule or engine changes.
+
+Usage:
+    python check_scalar_parity.py [--cases 2000] [--seed 0] [--rules finance_score_rules.yaml]
+"""
+
+import sys
+import json
+import math
+import random
+import logging
+import argparse
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import pandas as pd
+
+try:
+    from finance_rules import load_ruleset, resolve_rules_path
+    from finance_scalar import score_proposal
+    from finance_score_engine import AMOUNT_COLUMNS, FinanceScoreCalculator
+except ImportError:
+    from .finance_rules import load_ruleset, resolve_rules_path
+    from .finance_scalar import score_proposal
+    from .finance_score_engine import AMOUNT_COLUMNS, FinanceScoreCalculator
+
+logger = logging.getLogger(__name__)
+
+# Numerator column of each band component (the ratio's denominator is annual_income)
+COMPONENT_AMOUNTS = {
+    'sar_income_ratio': 'sum_assured',
+    'tsar_income_ratio': 'sum_assured',
+    'premium_income_ratio': 'premium',
+}
+
+
+def _spellings(value: float, rng: random.Random) -> Any:
+    """``value`` as one of the types extracted or posted amounts arrive in."""
+    kind = rng.randrange(4)
+    if kind == 0:
+        return value
+    if kind == 1:
+        return Decimal(repr(value))
+    if kind == 2:
+        return f"{value:,}"
+    return int(value) if float(value).is_integer() else value
+
+
+def edge_cases(ruleset, rng: random.Random) -> List[Dict[str, Any]]:
+    """Ratios on and next to every band edge, with the other amounts random."""
+    cases = []
+    income = 1_000_000.0
+    for component, bands in ruleset.bands.items():
+        amount = COMPONENT_AMOUNTS.get(component)
+        if amount is None:
+            continue
+        for edge in bands.edge_list:
+            for ratio in (math.nextafter(edge, -math.inf), edge, math.nextafter(edge, math.inf)):
+                case = random_case(rng)
+                case.update(annual_income=income, **{amount: ratio * income})
+                if component == 'tsar_income_ratio':
+                    case['other_insurance_sum_assured'] = 0.0
+                cases.append(case)
+    return cases
+
+
+def special_cases() -> List[Dict[str, Any]]:
+    """Zero and negative incomes and missing or unparsable amounts."""
+    base = {'annual_income': 500000.0, 'premium': 25000.0, 'sum_assured': 1500000.0, 'other_insurance_sum_assured': 200000.0}
+    cases = [dict(base, annual_income=0), dict(base, annual_income=0.0), dict(base, annual_income=-100000.0),
+             dict(base, annual_income='0'), dict(base, premium=0), dict(base, sum_assured=0.0)]
+    for col in AMOUNT_COLUMNS:
+        for value in (None, float('nan'), 'n/a', '', '-5', Decimal('-1'), Decimal('NaN'), '12,50,000', Decimal('1500000.50')):
+            cases.append(dict(base, **{col: value}))
+    return cases
+
+
+def random_case(rng: random.Random) -> Dict[str, Any]:
+    income = rng.choice([rng.uniform(1e5, 5e6), rng.uniform(1e5, 5e6), 0.0, None, -1.0])
+    def amount(scale):
+        if rng.random() < 0.08:
+            return rng.choice([None, float('nan'), 'invalid'])
+        return _spellings(round(rng.uniform(0, 8) * scale * (income or 1e6), 2), rng)
+    return {
+        'annual_income': income if income is None else _spellings(round(income, 2), rng),
+        'premium': amount(0.04),
+        'sum_assured': amount(1),
+        'other_insurance_sum_assured': amount(0.5),
+    }
+
+
+def build_cases(count: int, seed: int, ruleset) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    cases = edge_cases(ruleset, rng) + special_cases() + [random_case(rng) for _ in range(count)]
+    for number, case in enumerate(cases, start=1):
+        case['proposal_number'] = number
+        case['proposer_id'] = number % 97
+    return cases
+
+
+def _serialize(record: Dict[str, Any]) -> str:
+    # As export_per_proposal writes it
+    return json.dumps(record, default=lambda o: None)
+
+
+def check(cases: List[Dict[str, Any]], rules_path: str) -> int:
+    """Return the number of mismatching records; logs the first few."""
+    ruleset = load_ruleset(rules_path)
+    calculator = FinanceScoreCalculator(rules_path=rules_path, batch_invariant=True)
+    batch_df = calculator.calculate(pd.DataFrame(cases))
+    batch = [_serialize(record) for _, record in calculator.iter_records(batch_df)]
+    mismatches = 0
+    for case, batch_record in zip(cases, batch):
+        scalar = _serialize(score_proposal(case, ruleset))
+        alone_df = calculator.calculate(pd.DataFrame([case]))
+        alone = _serialize(next(calculator.iter_records(alone_df))[1])
+        if scalar != alone or scalar != batch_record:
+            mismatches += 1
+            if mismatches <= 5:
+                logger.error(f"Mismatch for {case!r}:\n  scalar: {scalar}\n  alone:  {alone}\n  batch:  {batch_record}")
+    return mismatches
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check finance_scalar against FinanceScoreCalculator")
+    parser.add_argument('--cases', type=int, default=2000, help="random cases on top of the edge and special cases")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rules', help="rules YAML (default: FIN_RULES_YAML or the bundled rules)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    rules_path = resolve_rules_path(args.rules)
+    cases = build_cases(args.cases, args.seed, load_ruleset(rules_path))
+    mismatches = check(cases, rules_path)
+    print(f"{len(cases)} cases against {rules_path}: {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
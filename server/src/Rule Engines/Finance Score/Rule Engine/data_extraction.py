@@ -7,9 +7,14 @@ input snapshots to JSON for auditability and traceability.
 """
 
 import os
+import json
+import numpy as np
+import time
+import threading
+import tempfile
 import pandas as pd
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator
 import logging
 from dotenv import load_dotenv
 
@@ -23,6 +28,111 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Columns the extraction result is validated for
+REQUIRED_COLUMNS = ['proposal_number', 'proposer_id', 'dob', 'annual_income']
+# Extracted input fields written to per-proposal input snapshots
+INPUT_FIELDS = ['proposal_number', 'proposer_id', 'stated_age', 'dob', 'occupation', 'annual_income', 'premium', 'sum_assured', 'other_insurance_sum_assured']
+# Column dtypes for the COPY extraction path (text columns are COALESCEd to '' in SQL)
+COPY_DTYPES = {
+    'proposal_number': 'int64',
+    'proposer_id': 'int64',
+    'dob': str,
+    'occupation': 'category',
+    'annual_income': 'float64',
+    'premium': 'float64',
+    'sum_assured': 'float64',
+    'other_insurance_sum_assured': 'float64',
+}
+# Compact in-memory schema for extracted frames (FIN_COMPACT_DTYPES=true)
+FINANCE_SCHEMA = {
+    'proposal_number': 'Int32',
+    'proposer_id': 'Int32',
+    'stated_age': 'Int16',
+    'dob': 'datetime64[ns]',
+    'occupation': 'category',
+    'annual_income': 'float64',
+    'premium': 'float64',
+    'sum_assured': 'float64',
+    'other_insurance_sum_assured': 'float64',
+}
+
+def apply_finance_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert an extracted frame to FINANCE_SCHEMA with column-wise casts.
+
+    Ids and age become nullable integers (widened to Int64 when values do not
+    fit), amounts float64, occupation categorical and dob datetime64 with NaT
+    for blank or unparseable dates. Columns that are not numeric (e.g. string
+    proposal numbers) are left unchanged.
+    """
+    df = df.copy()
+    for col, dtype in FINANCE_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if dtype == 'category':
+            df[col] = values.astype('category')
+        elif dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(values.replace('', None), errors='coerce', format='ISO8601').astype(dtype)
+        else:
+            numeric = pd.to_numeric(values, errors='coerce')
+            if int(numeric.isna().sum()) > int(values.isna().sum()):
+                logger.warning(f"Keeping column {col} as {values.dtype}: not all values are numeric")
+                continue
+            if dtype.startswith('Int'):
+                info = np.iinfo(dtype.lower())
+                if numeric.notna().any() and (numeric.min() < info.min or numeric.max() > info.max):
+                    dtype = 'Int64'
+            df[col] = numeric.astype(dtype)
+    return df
+
+
+def _input_json_default(obj):
+    # Convert date objects to string format for JSON serialization
+    if hasattr(obj, 'isoformat'):  # datetime.date objects
+        return obj.isoformat()
+    return str(obj) if obj is not None else None
+
+
+def export_per_proposal_inputs(df: pd.DataFrame, output_dir: str, id_col: str = 'proposal_number', store=None) -> None:
+    """Write one JSON per proposal with extracted input fields.
+
+    Files are written to a stable path: <output_dir>/inputs/finance_input_<proposal>.json
+    This promotes auditability by preserving the exact features used for scoring.
+    With a ``store`` (a finance_artifact_store.PackedArtifactStore) the records
+    are appended to its inputs segment instead.
+    """
+    if df is None or df.empty:
+        logger.info("No extracted inputs to export")
+        return
+    inputs_dir = os.path.join(output_dir, 'inputs')
+    if store is None:
+        os.makedirs(inputs_dir, exist_ok=True)
+    count = 0
+    for _, row in df.iterrows():
+        pid = row[id_col]
+        record = {k: row.get(k) for k in INPUT_FIELDS}
+        # Compact-schema frames: dates as YYYY-MM-DD ('' when missing, as the query COALESCEs), NA as null
+        if isinstance(record.get('dob'), pd.Timestamp):
+            record['dob'] = record['dob'].date().isoformat()
+        elif record.get('dob') is pd.NaT:
+            record['dob'] = ''
+        record = {k: (None if v is pd.NA else v) for k, v in record.items()}
+        if store is not None:
+            store.append('inputs', pid, record, default=_input_json_default)
+            count += 1
+            continue
+        out_path = os.path.join(inputs_dir, f"finance_input_{pid}.json")
+        try:
+            with open(out_path, 'w', encoding='utf-8') as fh:
+                json.dump(record, fh, indent=2, default=_input_json_default)
+            count += 1
+        except Exception:
+            logger.error("Failed to write input JSON for proposal %s", pid, exc_info=True)
+    if store is not None:
+        logger.info(f"Packed {count} per-proposal input records into {store.directory}")
+    else:
+        logger.info(f"Exported {count} per-proposal input JSON files to {inputs_dir}")
+
 class FinanceScoreDataExtractor:
     """Extracts and exports the minimal data required for Finance Score.
 
@@ -38,7 +148,16 @@ class FinanceScoreDataExtractor:
         """Initialize extractor with connection and table configuration from env.
 
         Required env vars: DB_HOST, DB_NAME, DB_USER, DB_PASSWORD.
-        Optional: DB_PORT (default 5432), DB_SCHEMA (default public), TBL_* overrides.
+        Optional: DB_PORT (default 5432), DB_SCHEMA (default public), TBL_* overrides,
+        FIN_EXTRACT_MODE ('query' or 'copy', default query), FIN_COMPACT_DTYPES
+        (apply FINANCE_SCHEMA to extracted frames, default false), FIN_QUERY_PLAN
+        ('aggregate-first' or 'gated', default aggregate-first), FIN_SCHEMA_CACHE
+        (introspection cache file, default
+        $XDG_CACHE_HOME or ~/.cache, then finance_score/schema_cache.json), FIN_SCHEMA_CACHE_TTL (seconds, 0 disables) and
+        the connection pool settings FIN_DB_POOL (default true), FIN_DB_POOL_MIN
+        (idle connections kept, default 1), FIN_DB_POOL_SIZE (default 4),
+        FIN_DB_POOL_TIMEOUT (seconds to wait for a free connection, default 30)
+        and FIN_DB_POOL_PRE_PING (default true).
         """
         self.connection_params = {
             'host': os.environ.get('DB_HOST'),
@@ -56,6 +175,21 @@ class FinanceScoreDataExtractor:
         self.tbl_insured_member = os.environ.get('TBL_INSURED_MEMBER', 'insured_member')
         self.tbl_previous_insurance = os.environ.get('TBL_PREVIOUS_INSURANCE', 'previous_insurance_details')
         self.tbl_rule_engine_trail = os.environ.get('TBL_RULE_ENGINE_TRAIL', 'rule_engine_trail')
+        # Bulk fetch strategy for extract(): 'query' (read_sql_query) or 'copy' (COPY ... TO STDOUT)
+        self.extract_mode = os.environ.get('FIN_EXTRACT_MODE', 'query').lower()
+        self.compact_dtypes = os.environ.get('FIN_COMPACT_DTYPES', 'false').lower() == 'true'
+        # Shape of the finance query (see build_finance_score_query)
+        self.query_plan = os.environ.get('FIN_QUERY_PLAN', 'aggregate-first').lower()
+        # Connection pool owned by the extractor (created on first get_connection)
+        self.pool_enabled = os.environ.get('FIN_DB_POOL', 'true').lower() == 'true'
+        self.pool_min = int(os.environ.get('FIN_DB_POOL_MIN', '1'))
+        self.pool_size = int(os.environ.get('FIN_DB_POOL_SIZE', '4'))
+        self.pool_timeout = float(os.environ.get('FIN_DB_POOL_TIMEOUT', '30'))
+        self.pool_pre_ping = os.environ.get('FIN_DB_POOL_PRE_PING', 'true').lower() == 'true'
+        self._pool = None
+        self._engine = None
+        self._pool_lock = threading.Lock()
+        self._engine_stats: Dict[str, int] = {'created': 0, 'checkouts': 0}
         
         # Validate required environment variables
         required_params = ['host', 'database', 'user', 'password']
@@ -67,16 +201,124 @@ class FinanceScoreDataExtractor:
         # Internal cache of available columns per table
         self._table_columns_cache: Dict[str, set] = {}
         self._existing_tables: set = set()
+        # Introspection results persisted across processes (see _load_schema_cache), in the
+        # user's cache directory rather than next to the source
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        self.schema_cache_path = os.environ.get('FIN_SCHEMA_CACHE', os.path.join(cache_home, 'finance_score', 'schema_cache.json'))
+        self.schema_cache_ttl = float(os.environ.get('FIN_SCHEMA_CACHE_TTL', '3600') or 0)
         logger.debug("Extractor initialized with schema=%s", self.db_schema)
         
     def _qual(self, table_name: str) -> str:
         """Return schema-qualified and quoted identifier for a table name."""
         return f'"{self.db_schema}"."{table_name}"' if self.db_schema else f'"{table_name}"'
     
+    def _schema_cache_key(self) -> str:
+        """Cache entry key: one entry per DB host/port, database and schema."""
+        params = self.connection_params
+        return f"{params['host']}:{params['port']}/{params['database']}/{self.db_schema}"
+
+    def _schema_fingerprint(self, conn) -> Optional[list]:
+        """Cheap catalog fingerprint of the schema's tables and columns.
+
+        A single pg_catalog aggregate (relation count, max relation OID and an
+        md5 of every relation's OID and name with its live columns' names and
+        types) that changes whenever a table is created, dropped, recreated or
+        renamed, or a column is added, dropped, renamed or retyped.
+        """
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT count(DISTINCT c.oid), COALESCE(max(c.oid::bigint), 0),
+                       COALESCE(md5(string_agg(concat_ws(':', c.oid, c.relname, a.attname, a.atttypid), ','
+                                               ORDER BY c.oid, a.attnum)), '')
+                FROM pg_catalog.pg_class c
+                LEFT JOIN pg_catalog.pg_attribute a
+                  ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+                WHERE c.relnamespace = to_regnamespace(%s) AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+                """,
+                [self.db_schema]
+            )
+            relations, max_oid, checksum = cur.fetchone()
+            return [int(relations), int(max_oid), checksum]
+
+    def _read_schema_cache_file(self) -> Dict[str, dict]:
+        try:
+            with open(self.schema_cache_path, 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable schema cache {self.schema_cache_path}: {e}")
+            return {}
+
+    def _load_schema_cache(self, conn=None) -> bool:
+        """Fill the in-memory caches from the schema cache file; True on a hit.
+
+        Within FIN_SCHEMA_CACHE_TTL of the last check the entry is used without
+        touching the database. An older entry is revalidated with the catalog
+        fingerprint (one cheap query, needs ``conn``) and its TTL renewed.
+        """
+        if self.schema_cache_ttl <= 0:
+            return False
+        key = self._schema_cache_key()
+        entry = self._read_schema_cache_file().get(key)
+        if not entry:
+            return False
+        if time.time() - entry.get('checked_at', 0) > self.schema_cache_ttl:
+            if conn is None:
+                return False
+            try:
+                if self._schema_fingerprint(conn) != entry.get('fingerprint'):
+                    logger.info(f"Schema changed since it was cached; re-introspecting {key}")
+                    return False
+            except Exception as e:
+                logger.debug(f"Schema cache revalidation failed: {e}")
+                return False
+            entry['checked_at'] = time.time()
+            self._write_schema_cache_entry(key, entry)
+        self._existing_tables = set(entry['tables'])
+        self._table_columns_cache = {table: set(cols) for table, cols in entry['columns'].items()}
+        logger.debug(f"Loaded schema introspection for {key} from {self.schema_cache_path}")
+        return True
+
+    def _write_schema_cache_entry(self, key: str, entry: dict) -> None:
+        """Atomically rewrite the cache file with ``entry`` stored under ``key``."""
+        data = self._read_schema_cache_file()
+        data[key] = entry
+        tmp_path = f"{self.schema_cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.schema_cache_path)), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump(data, fh, indent=2)
+            os.replace(tmp_path, self.schema_cache_path)
+        except Exception as e:
+            logger.warning(f"Could not write schema cache {self.schema_cache_path}: {e}")
+
+    def _save_schema_cache(self, conn) -> None:
+        if self.schema_cache_ttl <= 0 or not self._table_columns_cache:
+            return
+        try:
+            fingerprint = self._schema_fingerprint(conn)
+        except Exception as e:
+            logger.debug(f"Not caching schema introspection: {e}")
+            return
+        self._write_schema_cache_entry(self._schema_cache_key(), {
+            'tables': sorted(self._existing_tables),
+            'columns': {table: sorted(cols) for table, cols in self._table_columns_cache.items()},
+            'fingerprint': fingerprint,
+            'checked_at': time.time(),
+        })
+
     def _cache_columns(self, conn) -> None:
-        """Populate caches: list of existing tables and their columns in schema."""
+        """Populate caches: list of existing tables and their columns in schema.
+
+        Served from the schema cache file when it holds a current entry;
+        otherwise introspects information_schema and refreshes the file.
+        """
         if self._table_columns_cache:
             return
+        if self._load_schema_cache(conn):
+            return
         try:
             with conn.cursor() as cur:
                 cur.execute(
@@ -113,6 +355,7 @@ class FinanceScoreDataExtractor:
                         self._table_columns_cache[table_name] = set()
                     self._table_columns_cache[table_name].add(column_name)
             # Introspection complete
+            self._save_schema_cache(conn)
         except Exception as e:
             logger.warning(f"Could not introspect schema for dynamic query building: {e}")
     
@@ -138,29 +381,109 @@ class FinanceScoreDataExtractor:
         return f'{alias}."{col}"' if col else None
         
     def get_connection(self):
-        """Create a PostgreSQL connection (psycopg2) or SQLAlchemy engine fallback."""
+        """Check out a PostgreSQL connection (psycopg2) or SQLAlchemy engine fallback.
+
+        With pooling enabled (FIN_DB_POOL, default) psycopg2 connections come
+        from a FinanceConnectionPool and the SQLAlchemy engine is created once
+        with the same pool settings; both are owned by this extractor and
+        reused across calls. Hand connections back with release_connection().
+        """
         try:
             import psycopg2
-            conn = psycopg2.connect(
-                host=self.connection_params['host'],
-                port=self.connection_params['port'],
-                database=self.connection_params['database'],
-                user=self.connection_params['user'],
-                password=self.connection_params['password']
-            )
-            logger.info("Connected to PostgreSQL using psycopg2")
-            return conn, 'psycopg2'
+            if not self.pool_enabled:
+                conn = psycopg2.connect(
+                    host=self.connection_params['host'],
+                    port=self.connection_params['port'],
+                    database=self.connection_params['database'],
+                    user=self.connection_params['user'],
+                    password=self.connection_params['password']
+                )
+                logger.info("Connected to PostgreSQL using psycopg2")
+                return conn, 'psycopg2'
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._create_pool()
+            return self._pool.checkout(), 'psycopg2'
         except ImportError:
             try:
-                from sqlalchemy import create_engine
-                connection_string = f"postgresql://{self.connection_params['user']}:{self.connection_params['password']}@{self.connection_params['host']}:{self.connection_params['port']}/{self.connection_params['database']}"
-                engine = create_engine(connection_string)
-                logger.info("Using SQLAlchemy engine for PostgreSQL connection")
-                return engine, 'sqlalchemy'
+                from sqlalchemy import create_engine, event
+                with self._pool_lock:
+                    if self._engine is not None:
+                        return self._engine, 'sqlalchemy'
+                    connection_string = f"postgresql://{self.connection_params['user']}:{self.connection_params['password']}@{self.connection_params['host']}:{self.connection_params['port']}/{self.connection_params['database']}"
+                    if not self.pool_enabled:
+                        engine = create_engine(connection_string)
+                        logger.info("Using SQLAlchemy engine for PostgreSQL connection")
+                        return engine, 'sqlalchemy'
+                    engine = create_engine(
+                        connection_string,
+                        pool_size=self.pool_size,
+                        max_overflow=0,
+                        pool_timeout=self.pool_timeout,
+                        pool_pre_ping=self.pool_pre_ping,
+                    )
+                    stats = self._engine_stats
+                    def on_connect(*_):
+                        stats['created'] += 1
+                    def on_checkout(*_):
+                        stats['checkouts'] += 1
+                    event.listen(engine, 'connect', on_connect)
+                    event.listen(engine, 'checkout', on_checkout)
+                    self._engine = engine
+                    logger.info(f"Using pooled SQLAlchemy engine for PostgreSQL connection (size {self.pool_size}, pre-ping {self.pool_pre_ping})")
+                    return engine, 'sqlalchemy'
             except ImportError:
                 raise ImportError("Neither psycopg2 nor SQLAlchemy is installed. Please install one of them.")
 
-    def build_finance_score_query(self, conn=None) -> str:
+    def _create_pool(self):
+        """Open the psycopg2 pool configured by the FIN_DB_POOL_* settings."""
+        try:
+            from finance_db_pool import FinanceConnectionPool
+        except ImportError:
+            from .finance_db_pool import FinanceConnectionPool
+        pool = FinanceConnectionPool(
+            min(self.pool_min, self.pool_size), self.pool_size,
+            timeout=self.pool_timeout, pre_ping=self.pool_pre_ping,
+            host=self.connection_params['host'],
+            port=self.connection_params['port'],
+            database=self.connection_params['database'],
+            user=self.connection_params['user'],
+            password=self.connection_params['password']
+        )
+        logger.info(f"Opened PostgreSQL connection pool using psycopg2 (size {self.pool_size}, pre-ping {self.pool_pre_ping})")
+        return pool
+
+    def release_connection(self, conn, conn_type: str) -> None:
+        """Return a connection from get_connection() to the pool (or close it when unpooled)."""
+        if conn_type == 'psycopg2':
+            if self._pool is not None:
+                self._pool.release(conn)
+            else:
+                conn.close()
+        elif conn is not self._engine:
+            conn.dispose()
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Connection pool counters: connections created, checkouts, waits, etc."""
+        if self._pool is not None:
+            return self._pool.status()
+        if self._engine is not None:
+            return {**self._engine_stats, 'in_use': self._engine.pool.checkedout()}
+        return {}
+
+    def close(self) -> None:
+        """Log pool statistics and close every pooled connection."""
+        stats = self.pool_stats()
+        if stats:
+            logger.info(f"Connection pool stats: {stats}")
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+
+    def build_finance_score_query(self, conn=None, proposal_filter: bool = False) -> str:
         """Build SQL for the minimal dataset required to compute Finance Score.
 
         The query enforces the following gates:
@@ -169,10 +492,17 @@ class FinanceScoreDataExtractor:
         And aggregates:
         - member_sum_assured: SUM(insured_member.sum_insured) per proposer
         - previous_insurance_summary: SUM(previous sum insured) per proposer (optional table)
+
+        With ``proposal_filter`` the query is the gating-first plan restricted
+        to ``proposal_number = ANY(%(proposal_numbers)s)``, to be executed with
+        that parameter (see extract_proposals).
         """
         try:
             if conn is not None and conn.__class__.__module__.startswith('psycopg2'):
                 self._cache_columns(conn)
+            elif not self._table_columns_cache:
+                # No catalog access (e.g. SQLAlchemy engine): a fresh cache entry still applies
+                self._load_schema_cache()
         except Exception as e:
             logger.debug(f"Skipping introspection: {e}")
         
@@ -206,6 +536,14 @@ class FinanceScoreDataExtractor:
         has_member = self._has_table(self.tbl_insured_member) if self._existing_tables else True
         has_prev = self._has_table(self.tbl_previous_insurance) if self._existing_tables else False
         
+        if self.query_plan == 'gated' or proposal_filter:
+            # Only the gated plan restricts the aggregates to the selected proposers
+            return self._build_gated_query(
+                proposal_number, proposer_id_expr, occupation, annual_income, premium, stated_age, dob,
+                insured_member_sum, insured_member_proposer_fk, prev_ins_sum, prev_ins_proposer_fk,
+                has_member, has_prev, proposal_filter,
+            )
+        
         cte_parts: List[str] = []
         
         # Only need validated links, no extracted JSON
@@ -294,29 +632,122 @@ class FinanceScoreDataExtractor:
         # SQL ready for execution
         return query
 
+    def _build_gated_query(self, proposal_number: str, proposer_id_expr: str, occupation: str, annual_income: str,
+                           premium: str, stated_age: str, dob: str, insured_member_sum: str, insured_member_proposer_fk: str,
+                           prev_ins_sum: str, prev_ins_proposer_fk: str, has_member: bool, has_prev: bool,
+                           proposal_filter: bool = False) -> str:
+        """Gating-first variant of the finance query (FIN_QUERY_PLAN=gated).
+
+        The eligible (proposal, proposer) pairs are materialized first, with the
+        validated-documents and finreview gates as EXISTS semi-joins instead of
+        DISTINCT sets, and member / previous-insurance sums are aggregated only
+        for the proposers in that set. Returns the same rows as the default
+        aggregate-first query provided a proposal_number/proposer_id pair
+        appears once in the proposal table.
+        """
+        q_docs = self._qual(self.tbl_documents)
+        q_prop = self._qual(self.tbl_proposal)
+        q_proser = self._qual(self.tbl_proposer)
+        q_ret = self._qual(self.tbl_rule_engine_trail)
+        docs_proposal_number = self._resolve_col_expr('d', self.tbl_documents, ['proposal_number', 'proposal_no'], 'proposal_number')
+        docs_validated = self._resolve_col_expr('d', self.tbl_documents, ['validated', 'is_validated'], 'validated')
+        
+        ctes: List[str] = []
+        joins: List[str] = []
+        if has_member:
+            ctes.append(f"""
+            member_sum_assured AS (
+                SELECT 
+                    {insured_member_proposer_fk} as proposer_id,
+                    COALESCE(SUM({insured_member_sum}), 0) as sum_assured
+                FROM {self._qual(self.tbl_insured_member)} im
+                WHERE {insured_member_proposer_fk} IN (SELECT proposer_id FROM gated_proposals)
+                GROUP BY {insured_member_proposer_fk}
+            )""")
+            joins.append("LEFT JOIN member_sum_assured msa ON msa.proposer_id = g.proposer_id")
+        if has_prev:
+            ctes.append(f"""
+            previous_insurance_summary AS (
+                SELECT 
+                    {prev_ins_proposer_fk} as proposer_id,
+                    COALESCE(SUM({prev_ins_sum}), 0) as other_insurance_sum_assured
+                FROM {self._qual(self.tbl_previous_insurance)} pi
+                WHERE {prev_ins_proposer_fk} IN (SELECT proposer_id FROM gated_proposals)
+                GROUP BY {prev_ins_proposer_fk}
+            )""")
+            joins.append("LEFT JOIN previous_insurance_summary pis ON pis.proposer_id = g.proposer_id")
+        # Without the source table the amount is 0 for everyone (as in the default query)
+        sum_assured = 'COALESCE(msa.sum_assured, 0)' if has_member else '0::numeric'
+        other_sum_assured = 'COALESCE(pis.other_insurance_sum_assured, 0)' if has_prev else '0::numeric'
+        selected = f"AND {proposal_number} = ANY(%(proposal_numbers)s)" if proposal_filter else ''
+        
+        query = f"""
+        WITH
+        gated_proposals AS MATERIALIZED (
+            SELECT 
+                {proposal_number} as proposal_number,
+                {proposer_id_expr} as proposer_id,
+                COALESCE({stated_age}, 0) as stated_age,
+                COALESCE({dob}::text, '') as dob,
+                COALESCE({occupation}::text, '') as occupation,
+                COALESCE({annual_income}, 0) as annual_income,
+                COALESCE({premium}, 0) as premium
+            FROM {q_prop} p
+            INNER JOIN {q_proser} pr ON p."proposer_id" = pr."proposer_id"
+            WHERE EXISTS (
+                SELECT 1 FROM {q_docs} d
+                WHERE {docs_validated} = TRUE
+                  AND {docs_proposal_number} = {proposal_number}
+                  AND d."proposer_id" = pr."proposer_id"
+            )
+            AND EXISTS (
+                SELECT 1 FROM {q_ret} ret
+                WHERE COALESCE(ret."finreview_required", FALSE) = TRUE
+                  AND ret."proposal_number" = {proposal_number}
+            )
+            {selected}
+        ){''.join(',' + cte for cte in ctes)}
+        SELECT
+            g.proposal_number,
+            g.proposer_id,
+            g.stated_age,
+            g.dob,
+            g.occupation,
+            g.annual_income,
+            g.premium,
+            {sum_assured} as sum_assured,
+            {other_sum_assured} as other_insurance_sum_assured
+        FROM gated_proposals g
+        {' '.join(joins)}
+        ORDER BY g.proposal_number, g.proposer_id;
+        """
+        return query
+
     def extract(self) -> pd.DataFrame:
         """Execute extraction and return a DataFrame with required fields only."""
         try:
             logger.info("Starting data extraction for Finance Score (filtered by finreview_required)")
             conn, conn_type = self.get_connection()
-            if conn_type == 'psycopg2':
-                query = self.build_finance_score_query(conn)
-            else:
-                query = self.build_finance_score_query()
-            logger.debug("Executing SQL query to fetch proposals")
-            if conn_type == 'psycopg2':
-                df = pd.read_sql_query(query, conn)
-                conn.close()
-            else:
-                df = pd.read_sql_query(query, conn)
-                conn.dispose()
+            try:
+                if conn_type == 'psycopg2':
+                    query = self.build_finance_score_query(conn)
+                else:
+                    query = self.build_finance_score_query()
+                logger.debug("Executing SQL query to fetch proposals")
+                if conn_type == 'psycopg2' and self.extract_mode == 'copy':
+                    df = self._copy_query(conn, query)
+                else:
+                    df = pd.read_sql_query(query, conn)
+            finally:
+                self.release_connection(conn, conn_type)
+            if self.compact_dtypes:
+                df = apply_finance_schema(df)
             if df.empty:
                 logger.warning("No proposals matched finreview_required = TRUE with validated documents")
                 return df
             logger.info(f"Extraction complete. Proposals fetched: {len(df)}")
             # Validate critical columns presence and completeness
-            required_columns = ['proposal_number', 'proposer_id', 'dob', 'annual_income']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
             if missing_columns:
                 logger.error(f"Missing required columns: {missing_columns}")
             if 'dob' in df.columns:
@@ -328,6 +759,107 @@ class FinanceScoreDataExtractor:
             logger.error("Error extracting finance score data", exc_info=True)
             raise
 
+    def extract_proposals(self, proposal_numbers: List) -> pd.DataFrame:
+        """Extract the eligible rows of the given proposals only (gating-first plan, one round-trip).
+
+        Used by finance_work_queue workers to fetch the inputs of a claimed
+        batch; ineligible proposal numbers are simply absent from the result.
+        """
+        conn, conn_type = self.get_connection()
+        try:
+            if conn_type != 'psycopg2':
+                raise RuntimeError("Extracting selected proposals needs psycopg2")
+            query = self.build_finance_score_query(conn, proposal_filter=True)
+            df = pd.read_sql_query(query, conn, params={'proposal_numbers': list(proposal_numbers)})
+        finally:
+            self.release_connection(conn, conn_type)
+        if self.compact_dtypes:
+            df = apply_finance_schema(df)
+        logger.info(f"Extracted {len(df)} rows for {len(proposal_numbers)} selected proposals")
+        return df
+
+    def _copy_query(self, conn, query: str) -> pd.DataFrame:
+        """Fetch ``query`` with ``COPY (...) TO STDOUT`` and parse the CSV into typed columns.
+
+        The server streams CSV through ``copy_expert`` into a spooled temp file
+        (in memory up to 64 MB, on disk beyond that), which pandas' C parser
+        reads straight into the dtypes in COPY_DTYPES: integer ids, float64
+        amounts and categorical occupation. Blank text stays '' as in
+        ``read_sql_query``; only amount columns treat an empty field as NaN.
+        """
+        copy_sql = f"COPY ({query.strip().rstrip(';')}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024, mode='w+b') as buf:
+            with conn.cursor() as cur:
+                cur.copy_expert(copy_sql, buf)
+            buf.seek(0)
+            amounts = [col for col, dtype in COPY_DTYPES.items() if dtype == 'float64']
+            return pd.read_csv(
+                buf,
+                dtype=COPY_DTYPES,
+                keep_default_na=False,
+                na_values={col: [''] for col in amounts},
+            )
+
+    def iter_extract(self, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Yield the extraction result in DataFrames of at most ``batch_size`` rows.
+
+        Rows are fetched through a server-side (named) cursor with ``fetchmany``,
+        or a streaming SQLAlchemy connection, so client memory is bounded by one
+        batch regardless of how many proposals are eligible. Batches carry the
+        same dtypes as ``extract()`` (numeric columns coerced to float, as
+        ``read_sql_query`` does, or FINANCE_SCHEMA with FIN_COMPACT_DTYPES).
+        The missing-column and DOB-null checks run as counters across batches
+        and are logged once the stream is exhausted; the totals are also kept
+        in ``self.last_extract_stats``.
+        """
+        logger.info(f"Starting streaming data extraction for Finance Score (batch size {batch_size})")
+        stats = {'rows': 0, 'batches': 0, 'dob_nulls': 0, 'missing_columns': []}
+        self.last_extract_stats = stats
+        conn, conn_type = self.get_connection()
+        try:
+            for batch in self._iter_batches(conn, conn_type, batch_size):
+                if self.compact_dtypes:
+                    batch = apply_finance_schema(batch)
+                if stats['batches'] == 0:
+                    stats['missing_columns'] = [col for col in REQUIRED_COLUMNS if col not in batch.columns]
+                    if stats['missing_columns']:
+                        logger.error(f"Missing required columns: {stats['missing_columns']}")
+                stats['batches'] += 1
+                stats['rows'] += len(batch)
+                if 'dob' in batch.columns:
+                    stats['dob_nulls'] += int(batch['dob'].isnull().sum())
+                logger.debug(f"Fetched batch {stats['batches']} ({stats['rows']} rows so far)")
+                yield batch
+        finally:
+            self.release_connection(conn, conn_type)
+
+        if stats['rows'] == 0:
+            logger.warning("No proposals matched finreview_required = TRUE with validated documents")
+            return
+        logger.info(f"Extraction complete. Proposals fetched: {stats['rows']} in {stats['batches']} batches")
+        if stats['dob_nulls'] > 0:
+            logger.warning(f"DOB nulls: {stats['dob_nulls']}/{stats['rows']}")
+
+    def _iter_batches(self, conn, conn_type: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Run the finance query on ``conn`` and yield result batches of ``batch_size`` rows."""
+        if conn_type == 'psycopg2':
+            # Named cursors reject a trailing semicolon (the query is wrapped in DECLARE)
+            query = self.build_finance_score_query(conn).strip().rstrip(';')
+            with conn.cursor(name='finance_score_extract') as cur:
+                cur.itersize = batch_size
+                cur.execute(query)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield pd.DataFrame.from_records(rows, columns=[d[0] for d in cur.description], coerce_float=True)
+        else:
+            query = self.build_finance_score_query()
+            with conn.connect() as sa_conn:
+                stream = sa_conn.execution_options(stream_results=True)
+                for batch in pd.read_sql_query(query, stream, chunksize=batch_size):
+                    yield batch
+
     def export_data(self, df: pd.DataFrame, format_type: str = 'json', filename: str = 'finance_score_data') -> str:
         """Export a full dataset snapshot (JSON or Parquet) with a timestamped filename."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -344,6 +876,7 @@ class FinanceScoreDataExtractor:
 
     def debug_schema(self) -> None:
         """Debug method to check actual database schema and sample data."""
+        conn = None
         try:
             conn, conn_type = self.get_connection()
             q_proser = self._qual(self.tbl_proposer)
@@ -391,46 +924,19 @@ class FinanceScoreDataExtractor:
                         """)
                         tables = cur.fetchall()
                         logger.info(f"Tables with 'proposer' in name: {[t[0] for t in tables]}")
-                
-                conn.close()
             else:
                 # SQLAlchemy fallback
                 df_schema = pd.read_sql_query(schema_query, conn)
                 logger.info(f"Proposer table schema ({len(df_schema)} columns):")
                 for _, row in df_schema.iterrows():
                     logger.info(f"  {row['column_name']}: {row['data_type']} (nullable: {row['is_nullable']})")
-                conn.dispose()
                 
         except Exception as e:
             logger.error(f"Error debugging schema: {e}", exc_info=True)
+        finally:
+            if conn is not None:
+                self.release_connection(conn, conn_type)
 
-    def export_per_proposal_inputs(self, df: pd.DataFrame, output_dir: str, id_col: str = 'proposal_number') -> None:
-        """Write one JSON per proposal with extracted input fields.
-
-        Files are written to a stable path: <output_dir>/inputs/finance_input_<proposal>.json
-        This promotes auditability by preserving the exact features used for scoring.
-        """
-        if df is None or df.empty:
-            logger.info("No extracted inputs to export")
-            return
-        inputs_dir = os.path.join(output_dir, 'inputs')
-        os.makedirs(inputs_dir, exist_ok=True)
-        count = 0
-        fields = ['proposal_number', 'proposer_id', 'stated_age', 'dob', 'occupation', 'annual_income', 'premium', 'sum_assured', 'other_insurance_sum_assured']
-        for _, row in df.iterrows():
-            pid = row[id_col]
-            record = {k: row.get(k) for k in fields}
-            out_path = os.path.join(inputs_dir, f"finance_input_{pid}.json")
-            try:
-                with open(out_path, 'w', encoding='utf-8') as fh:
-                    import json
-                    # Convert date objects to string format for JSON serialization
-                    def json_serializer(obj):
-                        if hasattr(obj, 'isoformat'):  # datetime.date objects
-                            return obj.isoformat()
-                        return str(obj) if obj is not None else None
-                    json.dump(record, fh, indent=2, default=json_serializer)
-                count += 1
-            except Exception:
-                logger.error("Failed to write input JSON for proposal %s", pid, exc_info=True)
-        logger.info(f"Exported {count} per-proposal input JSON files to {inputs_dir}") 
\ No newline at end of file
+    def export_per_proposal_inputs(self, df: pd.DataFrame, output_dir: str, id_col: str = 'proposal_number', store=None) -> None:
+        """Write one JSON per proposal with extracted input fields (see module-level export_per_proposal_inputs)."""
+        export_per_proposal_inputs(df, output_dir, id_col, store) 
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""Compare the query plans of the finance extraction query on seeded data.
+
+Seeds the scratch schema used by benchmark_extraction.py (DB_* env vars) with
+a population where only a share of proposals pass the finreview gate, then
+runs EXPLAIN (ANALYZE, BUFFERS) for each FIN_QUERY_PLAN variant of
+build_finance_score_query and reports execution time, shared buffers touched
+and the row count, after checking both variants return the same rows.
+
+Usage:
+    python explain_finance_query.py --rows 200000 --eligible-share 0.05 [--show-plans] [--keep]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+try:
+    from data_extraction import FinanceScoreDataExtractor
+    from benchmark_extraction import BENCH_SCHEMA, build_dataset
+except ImportError:
+    from .data_extraction import FinanceScoreDataExtractor
+    from .benchmark_extraction import BENCH_SCHEMA, build_dataset
+
+QUERY_PLANS = ('aggregate-first', 'gated')
+
+
+def explain(conn, query: str) -> dict:
+    """Run EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and return the top-level result."""
+    with conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.strip().rstrip(';')}")
+        result = cur.fetchone()[0]
+    conn.rollback()
+    return (json.loads(result) if isinstance(result, str) else result)[0]
+
+
+def result_digest(conn, query: str):
+    """Row count and order-sensitive digest of the query result."""
+    digest = hashlib.sha256()
+    count = 0
+    with conn.cursor() as cur:
+        cur.execute(query)
+        for row in cur:
+            digest.update(repr(row).encode())
+            count += 1
+    conn.rollback()
+    return count, digest.hexdigest()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--eligible-share', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3, help='EXPLAIN runs per plan; the fastest is reported')
+    parser.add_argument('--show-plans', action='store_true', help='print the text plan of each variant')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch schema afterwards')
+    args = parser.parse_args()
+
+    extractor = FinanceScoreDataExtractor()
+    extractor.db_schema = BENCH_SCHEMA
+    conn, conn_type = extractor.get_connection()
+    if conn_type != 'psycopg2':
+        logger.error("The EXPLAIN harness needs psycopg2")
+        return 1
+    try:
+        build_dataset(conn, BENCH_SCHEMA, args.rows, args.eligible_share)
+        results = {}
+        for plan in QUERY_PLANS:
+            extractor.query_plan = plan
+            query = extractor.build_finance_score_query(conn)
+            runs = [explain(conn, query) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['Execution Time'])
+            top = best['Plan']
+            results[plan] = {
+                'ms': best['Execution Time'],
+                'buffers': top.get('Shared Hit Blocks', 0) + top.get('Shared Read Blocks', 0),
+                'rows': result_digest(conn, query),
+            }
+            if args.show_plans:
+                with conn.cursor() as cur:
+                    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query.strip().rstrip(';')}")
+                    print(f"--- {plan} ---")
+                    print('\n'.join(r[0] for r in cur.fetchall()))
+                conn.rollback()
+
+        print(f"{args.rows} proposals, eligible share {args.eligible_share:g}")
+        print(f"{'plan':>16} {'exec ms':>10} {'buffers':>10} {'rows':>8}")
+        for plan, r in results.items():
+            print(f"{plan:>16} {r['ms']:>10.1f} {r['buffers']:>10} {r['rows'][0]:>8}")
+        if len({r['rows'] for r in results.values()}) != 1:
+            logger.error("Query variants returned different rows")
+            return 1
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE')
+            conn.commit()
+        extractor.release_connection(conn, conn_type)
+        extractor.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Packed storage for per-proposal finance artifacts.
+
+By default the pipeline writes two pretty-printed JSON files per proposal
+into ``finance_scores/YYYYMMDD/``. With FIN_ARTIFACT_STORE=packed the same
+records are appended instead to one gzip JSON-lines segment per run and kind
+under ``YYYYMMDD/packed/``:
+
+    packed/scores-<run>.jsonl.gz    one record per line
+    packed/scores-<run>.idx.json    {"segment": ..., "records": {proposal_number: byte offset}}
+    packed/inputs-<run>.jsonl.gz / .idx.json
+
+Every record is its own gzip member, so a segment is still an ordinary
+``.jsonl.gz`` file (``zcat`` works) while a single proposal is fetched by
+seeking to its offset and inflating just that member. ``FinanceArtifactReader``
+reads both layouts, so audits keep working across days written either way.
+
+Usage:
+    python finance_artifact_store.py finance_scores/20250101 <proposal_number> [--inputs]
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import zlib
+import logging
+import argparse
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_STORES = ('files', 'packed')
+PACKED_DIR = 'packed'
+SEGMENT_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx.json'
+# gzip container (wbits 16 + 15) for compress/decompress objects
+GZIP_WBITS = 31
+
+
+def resolve_artifact_store(store: Optional[str] = None) -> str:
+    """Return the configured artifact layout: ``store``, FIN_ARTIFACT_STORE, or 'files'."""
+    store = (store or os.environ.get('FIN_ARTIFACT_STORE', 'files')).lower()
+    if store not in ARTIFACT_STORES:
+        raise ValueError(f"Unknown artifact store {store!r}; expected one of {', '.join(ARTIFACT_STORES)}")
+    return store
+
+
+def _gzip_member(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class PackedSegmentWriter:
+    """Append-only gzip JSON-lines segment plus its ``proposal_number -> offset`` index.
+
+    The index is written when the segment is closed; a segment left without
+    one (a crashed run, or one still being written) is re-indexed by scanning
+    when it is read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        self.offsets: Dict[str, int] = {}
+        self._fh = open(path, 'ab')
+        self._offset = self._fh.tell()
+
+    def append(self, pid, record: Dict[str, Any], default: Callable[[Any], Any]) -> None:
+        line = json.dumps(record, separators=(',', ':'), default=default) + '\n'
+        member = _gzip_member(line.encode('utf-8'))
+        self._fh.write(member)
+        self.offsets[str(pid)] = self._offset
+        self._offset += len(member)
+
+    def flush(self) -> None:
+        """Push the appended records to the file, so a crash from here on loses none of them."""
+        if not self._fh.closed:
+            self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        self._fh.close()
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump({'segment': os.path.basename(self.path), 'records': self.offsets}, fh, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"Packed {len(self.offsets)} records into {self.path}")
+
+
+class PackedArtifactStore:
+    """The segments one run (or one worker process) writes into a dated output folder.
+
+    Segments are opened on first use, one per kind, and named by start time
+    and process id so concurrent writers never share a file.
+    """
+
+    def __init__(self, output_dir: str):
+        self.directory = os.path.join(output_dir, PACKED_DIR)
+        self.run_id = f"{datetime.now().strftime('%H%M%S%f')}-{os.getpid()}"
+        self._writers: Dict[str, PackedSegmentWriter] = {}
+
+    def append(self, kind: str, pid, record: Dict[str, Any], default: Callable[[Any], Any]) -> None:
+        writer = self._writers.get(kind)
+        if writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            writer = PackedSegmentWriter(os.path.join(self.directory, f"{kind}-{self.run_id}{SEGMENT_SUFFIX}"))
+            self._writers[kind] = writer
+        writer.append(pid, record, default)
+
+    def flush(self) -> None:
+        """Flush every open segment and keep it open for more records (indexes are written on close)."""
+        for writer in self._writers.values():
+            writer.flush()
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+
+
+def _scan_segment(path: str) -> Dict[str, int]:
+    """Rebuild a segment's offsets by inflating it member by member."""
+    with open(path, 'rb') as fh:
+        data = memoryview(fh.read())
+    offsets: Dict[str, int] = {}
+    pos = 0
+    while pos < len(data):
+        inflater = zlib.decompressobj(GZIP_WBITS)
+        try:
+            line = inflater.decompress(data[pos:])
+        except zlib.error:
+            logger.warning(f"Truncated packed segment {path} at byte {pos}; later records skipped")
+            break
+        if not inflater.eof:
+            logger.warning(f"Truncated packed segment {path} at byte {pos}; later records skipped")
+            break
+        offsets[str(json.loads(line)['proposal_number'])] = pos
+        pos = len(data) - len(inflater.unused_data)
+    return offsets
+
+
+def _read_member(path: str, offset: int) -> Dict[str, Any]:
+    inflater = zlib.decompressobj(GZIP_WBITS)
+    out = b''
+    with open(path, 'rb') as fh:
+        fh.seek(offset)
+        while not inflater.eof:
+            chunk = fh.read(65536)
+            if not chunk:
+                raise ValueError(f"Truncated record at byte {offset} of {path}")
+            out += inflater.decompress(chunk)
+    return json.loads(out)
+
+
+class FinanceArtifactReader:
+    """Read per-proposal artifacts of one dated folder, packed or one-file-per-proposal.
+
+    ``get_score`` / ``get_input`` return the newest record for a proposal;
+    when both layouts hold one (the store was switched mid-day), the more
+    recently written file wins.
+    """
+
+    LEGACY_PATTERNS = {
+        'scores': 'finance_score_{pid}.json',
+        'inputs': os.path.join('inputs', 'finance_input_{pid}.json'),
+    }
+
+    def __init__(self, day_dir: str):
+        self.day_dir = day_dir
+        self._index: Dict[str, Dict[str, Tuple[str, int]]] = {}
+
+    def _packed_index(self, kind: str) -> Dict[str, Tuple[str, int]]:
+        if kind not in self._index:
+            index: Dict[str, Tuple[str, int]] = {}
+            # Run ids start with the time of day, so later runs override earlier ones
+            for segment in sorted(glob.glob(os.path.join(self.day_dir, PACKED_DIR, f"{kind}-*{SEGMENT_SUFFIX}"))):
+                index_path = segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+                if os.path.exists(index_path):
+                    with open(index_path, 'r', encoding='utf-8') as fh:
+                        offsets = json.load(fh)['records']
+                else:
+                    logger.info(f"No index for {segment}; scanning it")
+                    offsets = _scan_segment(segment)
+                index.update((pid, (segment, offset)) for pid, offset in offsets.items())
+            self._index[kind] = index
+        return self._index[kind]
+
+    def get(self, kind: str, pid) -> Optional[Dict[str, Any]]:
+        """Return the ``kind`` ('scores' or 'inputs') record of proposal ``pid``, or None."""
+        packed = self._packed_index(kind).get(str(pid))
+        legacy = os.path.join(self.day_dir, self.LEGACY_PATTERNS[kind].format(pid=pid))
+        if os.path.exists(legacy) and (packed is None or os.path.getmtime(legacy) > os.path.getmtime(packed[0])):
+            with open(legacy, 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        if packed is None:
+            return None
+        return _read_member(*packed)
+
+    def get_score(self, pid) -> Optional[Dict[str, Any]]:
+        return self.get('scores', pid)
+
+    def get_input(self, pid) -> Optional[Dict[str, Any]]:
+        return self.get('inputs', pid)
+
+    def iter_records(self, kind: str) -> Iterator[Dict[str, Any]]:
+        """Yield every ``kind`` record of the folder: per-proposal files first, then packed segments in run order.
+
+        A proposal written more than once appears more than once; the last
+        occurrence is the newest within each layout.
+        """
+        for path in sorted(glob.glob(os.path.join(self.day_dir, self.LEGACY_PATTERNS[kind].format(pid='*')))):
+            with open(path, 'r', encoding='utf-8') as fh:
+                yield json.load(fh)
+        for segment in sorted(glob.glob(os.path.join(self.day_dir, PACKED_DIR, f"{kind}-*{SEGMENT_SUFFIX}"))):
+            with gzip.open(segment, 'rt', encoding='utf-8') as fh:
+                for line in fh:
+                    yield json.loads(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Print one proposal's finance artifact from a dated output folder")
+    parser.add_argument('day_dir', help="dated output folder, e.g. finance_scores/20250101")
+    parser.add_argument('proposal_number')
+    parser.add_argument('--inputs', action='store_true', help="print the extracted inputs instead of the score")
+    args = parser.parse_args(argv)
+    record = FinanceArtifactReader(args.day_dir).get('inputs' if args.inputs else 'scores', args.proposal_number)
+    if record is None:
+        print(f"No artifact for proposal {args.proposal_number} in {args.day_dir}", file=sys.stderr)
+        return 1
+    print(json.dumps(record, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
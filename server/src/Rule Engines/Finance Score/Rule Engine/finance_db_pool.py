@@ -0,0 +1,89 @@
+"""Pooled psycopg2 connections for the Finance Score extractor.
+
+``FinanceConnectionPool`` is a ``ThreadedConnectionPool`` that waits up to a
+timeout for a free connection instead of failing immediately, optionally
+pre-pings connections before handing them out, and counts what it does
+(connections created, checkouts, waits, timeouts, discarded connections) so
+the extractor can log pool statistics.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict
+
+import psycopg2
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class FinanceConnectionPool(ThreadedConnectionPool):
+    """Thread-safe psycopg2 pool with checkout timeout, pre-ping and statistics.
+
+    ``minconn`` connections are opened up front and kept idle between
+    checkouts; up to ``maxconn`` may be checked out at once. Use
+    :meth:`checkout` / :meth:`release` rather than ``getconn``/``putconn``.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float = 30.0, pre_ping: bool = True, **connect_kwargs):
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.stats: Dict[str, int] = {'created': 0, 'checkouts': 0, 'waits': 0, 'timeouts': 0, 'discarded': 0}
+        self._available = threading.Condition()
+        super().__init__(minconn, maxconn, **connect_kwargs)
+
+    def _connect(self, key=None):
+        self.stats['created'] += 1
+        return super()._connect(key)
+
+    def checkout(self):
+        """Return a live connection, waiting up to ``timeout`` seconds for a free one."""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._available:
+            while True:
+                try:
+                    conn = self.getconn()
+                    break
+                except PoolError:
+                    if self.closed:
+                        raise
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise TimeoutError(f"No database connection became free within {self.timeout:g}s (pool size {self.maxconn})")
+                    if not waited:
+                        self.stats['waits'] += 1
+                        waited = True
+                    self._available.wait(remaining)
+            self.stats['checkouts'] += 1
+        if self.pre_ping and not self._is_alive(conn):
+            logger.info("Discarding dead pooled database connection")
+            self.release(conn, discard=True)
+            return self.checkout()
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        """Return ``conn`` to the pool (rolled back), or close it when ``discard`` is set."""
+        with self._available:
+            if discard:
+                self.stats['discarded'] += 1
+            self.putconn(conn, close=discard)
+            self._available.notify()
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def status(self) -> Dict[str, int]:
+        """Counters plus the current number of idle and checked-out connections."""
+        return {**self.stats, 'idle': len(self._pool), 'in_use': len(self._used)}
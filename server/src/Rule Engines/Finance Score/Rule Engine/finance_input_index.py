@@ -0,0 +1,85 @@
+"""Incremental-run state for the Finance Score pipeline.
+
+Keeps a small sidecar index (``<output root>/input_index.json``) of the hash
+of each proposal's extracted input fields from previous runs, so a run can
+score and export only proposals that are new or whose inputs changed.
+"""
+
+import os
+import json
+import logging
+from typing import Dict
+
+import pandas as pd
+
+try:
+    from data_extraction import INPUT_FIELDS
+except ImportError:
+    from .data_extraction import INPUT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+class FinanceInputIndex:
+    """Per-proposal input hashes from earlier runs, keyed by ``proposal_number:proposer_id``.
+
+    The digest of the rules file is stored with the hashes; when the rules
+    change, the previous hashes are discarded and every proposal is re-scored.
+    Hashes of selected rows are only recorded on :meth:`commit`, after their
+    artifacts were written, so a failed run is retried in full next time.
+    """
+
+    FILENAME = 'input_index.json'
+
+    def __init__(self, output_root: str, rules_digest: str):
+        self.path = os.path.join(output_root, self.FILENAME)
+        self.rules_digest = rules_digest
+        self.hashes: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+        self.skipped = 0
+        self.rescored = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read input index {self.path}; re-scoring all proposals: {e}")
+                data = {}
+            if data.get('rules_digest') == rules_digest:
+                self.hashes = data.get('hashes', {})
+            elif data:
+                logger.info("Rules changed since the last incremental run; re-scoring all proposals")
+        logger.info(f"Loaded {len(self.hashes)} input hashes from {self.path}")
+
+    @staticmethod
+    def _row_keys(df: pd.DataFrame) -> pd.Series:
+        return df['proposal_number'].astype(str) + ':' + df['proposer_id'].astype(str)
+
+    @staticmethod
+    def _row_hashes(df: pd.DataFrame) -> pd.Series:
+        """Hash the extracted input fields of each row (vectorized, 64-bit)."""
+        fields = [f for f in INPUT_FIELDS if f in df.columns]
+        return pd.util.hash_pandas_object(df[fields], index=False).astype(str)
+
+    def select_changed(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return the rows that are new or whose inputs changed since the last run."""
+        if df is None or df.empty:
+            return df
+        keys = self._row_keys(df)
+        hashes = self._row_hashes(df)
+        changed = (keys.map(self.hashes) != hashes).to_numpy()
+        self._pending.update(zip(keys[changed], hashes[changed]))
+        self.rescored += int(changed.sum())
+        self.skipped += int((~changed).sum())
+        return df.loc[changed]
+
+    def commit(self) -> None:
+        """Record the hashes of scored rows and atomically rewrite the index file."""
+        self.hashes.update(self._pending)
+        self._pending.clear()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump({'rules_digest': self.rules_digest, 'hashes': self.hashes}, fh)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Incremental run: re-scored {self.rescored} new/changed proposals, skipped {self.skipped} unchanged")
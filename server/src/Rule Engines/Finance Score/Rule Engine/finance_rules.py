@@ -0,0 +1,369 @@
+"""Compiled forms of the Finance Score YAML rules.
+
+The rule engine evaluates component bands and decision rules in YAML order,
+first match wins. This module turns band lists into sorted NumPy edge arrays
+and the ``decisions`` block into a dense lookup table, so whole columns of
+proposals can be scored and classified without a Python loop per row.
+
+``load_ruleset`` parses, validates and compiles a rules file once per process
+and per file version; callers re-check it cheaply and pick up edits without a
+restart.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from bisect import bisect_left
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLAG = 'Manual Review'
+COMPONENTS = ('sar_income_ratio', 'tsar_income_ratio', 'premium_income_ratio')
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'finance_score_rules.yaml')
+
+
+def resolve_rules_path(rules_path: Optional[str] = None) -> str:
+    """Return the rules file to use: explicit path, else FIN_RULES_YAML, else the bundled YAML."""
+    return rules_path or os.environ.get('FIN_RULES_YAML', DEFAULT_RULES_PATH)
+
+
+def component_weights(rules: Dict[str, Any]) -> Tuple[float, float, float]:
+    """Return the (SAR, TSAR, Premium) aggregation weights with engine defaults."""
+    weights = rules.get('weights', {})
+    return (
+        float(weights.get('sar_income_ratio', 0.5)),
+        float(weights.get('tsar_income_ratio', 0.25)),
+        float(weights.get('premium_income_ratio', 0.25)),
+    )
+
+
+def match_band(value: float, bands: List[Dict[str, Any]]) -> Optional[Any]:
+    """Return the score of the first band containing ``value``, else None."""
+    for band in bands:
+        min_v = band.get('min', None)
+        max_v = band.get('max', None)
+        inclusive_max = band.get('inclusive_max', True)
+        score = band['score']
+        ok_min = True if min_v is None else (value >= min_v)
+        if max_v is None:
+            ok_max = True
+        else:
+            ok_max = (value <= max_v) if inclusive_max else (value < max_v)
+        if ok_min and ok_max:
+            return score
+    return None
+
+
+class CompiledBands:
+    """A component's band list compiled into sorted edges and region scores.
+
+    The distinct ``min``/``max`` values split the number line into open
+    intervals and single edge points. Every value inside one region compares
+    the same way against every band, so the first matching band (honouring
+    ``inclusive_max``) is resolved once per region at compile time. Region
+    ``2*i`` is the open interval below ``edges[i]``, region ``2*i + 1`` is the
+    edge itself, and the last region lies above the highest edge.
+    """
+
+    def __init__(self, bands: List[Dict[str, Any]]):
+        self.bands = list(bands or [])
+        edges = sorted({float(b[k]) for b in self.bands for k in ('min', 'max') if b.get(k) is not None})
+        probes: List[float] = []
+        for i, edge in enumerate(edges):
+            below = edges[i - 1] if i else edge - abs(edge) - 1.0
+            probes.append((below + edge) / 2.0)
+            probes.append(edge)
+        probes.append(edges[-1] + abs(edges[-1]) + 1.0 if edges else 0.0)
+        scores = [match_band(p, self.bands) for p in probes]
+        self.edge_list = edges
+        self.edges = np.asarray(edges, dtype='float64')
+        self.region_scores = np.array([np.nan if s is None else s for s in scores], dtype='float64')
+        # Integer scores come back as int64 columns when nothing is missing,
+        # mirroring what Series.apply infers on the row-wise path.
+        self.integral = all(isinstance(s, int) and not isinstance(s, bool) for s in scores if s is not None)
+        # Scalar scores as a batch-invariant engine row holds them: int for all-integer bands, else float
+        self.region_values = [None if s is None else (int(s) if self.integral else float(s)) for s in scores]
+
+    def lookup(self, values: np.ndarray) -> np.ndarray:
+        """Score a float64 array; NaN inputs and unmatched values yield NaN."""
+        values = np.asarray(values, dtype='float64')
+        out = np.full(values.shape, np.nan)
+        valid = ~np.isnan(values)
+        v = values[valid]
+        pos = np.searchsorted(self.edges, v, side='left')
+        on_edge = np.zeros(v.shape, dtype=bool)
+        inside = pos < self.edges.size
+        on_edge[inside] = self.edges[pos[inside]] == v[inside]
+        out[valid] = self.region_scores[2 * pos + on_edge]
+        return out
+
+    def score(self, value: float) -> Optional[Any]:
+        """Score one non-missing value with ``bisect``; returns the band score (int or float, see region_values) or None."""
+        pos = bisect_left(self.edge_list, value)
+        on_edge = pos < len(self.edge_list) and self.edge_list[pos] == value
+        return self.region_values[2 * pos + on_edge]
+
+
+def match_category(score: int, categories: List[Dict[str, Any]]) -> Optional[str]:
+    """Return the label of the first risk category for a final score, else None."""
+    for rule in categories:
+        if rule['score'] == score:
+            return rule['label']
+    return None
+
+
+def _conditions_hold(cond: Dict[str, Any], score: int, sar, prem) -> bool:
+    """Evaluate one underwriting flag ``when`` block."""
+    if 'final_score_in' in cond and score not in cond['final_score_in']:
+        return False
+    if 'premium_score_in' in cond and prem not in cond['premium_score_in']:
+        return False
+    if 'sar_score_in' in cond and sar not in cond['sar_score_in']:
+        return False
+    return True
+
+
+def match_flag(score: int, sar, prem, flags: List[Dict[str, Any]]) -> str:
+    """Return the first underwriting flag whose conditions hold, else the default."""
+    for rule in flags:
+        if _conditions_hold(rule.get('when', {}), score, sar, prem):
+            return rule.get('flag', DEFAULT_FLAG)
+    return DEFAULT_FLAG
+
+
+class DecisionTable:
+    """The ``decisions`` block compiled into a dense (final, SAR, premium) table.
+
+    Each axis holds the finite set of values the compiled bands and weights can
+    produce, with index 0 reserved for a missing score; for the shipped rules
+    that is a 6x6x6 table. Category and flag for a whole frame are then one
+    fancy-indexing operation. Scores outside those axes (only possible when a
+    caller supplies its own score columns) are reported as unresolved so the
+    engine can fall back to the row-wise rules for them.
+    """
+
+    def __init__(self, rules: Dict[str, Any], bands: Dict[str, CompiledBands]):
+        decisions = rules.get('decisions', {})
+        categories = decisions.get('risk_categories', [])
+        flags = decisions.get('underwriting_flags', [])
+        self.categories = categories
+        self.flags = flags
+        w_sar, w_tsar, w_prem = component_weights(rules)
+
+        def domain(component: str) -> List[Any]:
+            compiled = bands.get(component) or CompiledBands([])
+            values = sorted({s for s in compiled.region_scores.tolist() if not np.isnan(s)})
+            return [int(v) for v in values] if compiled.integral else values
+
+        sar_values = domain('sar_income_ratio')
+        tsar_values = domain('tsar_income_ratio')
+        prem_values = domain('premium_income_ratio')
+        reachable = set()
+        for sar, tsar, prem in product(sar_values, tsar_values, prem_values):
+            final = int(np.round(float(sar) * w_sar + float(tsar) * w_tsar + float(prem) * w_prem))
+            reachable.add((final, sar, prem))
+        final_values = sorted({combo[0] for combo in reachable})
+
+        self.final_positions = {v: i for i, v in enumerate(final_values, start=1)}
+        self.sar_positions = {v: i for i, v in enumerate(sar_values, start=1)}
+        self.prem_positions = {v: i for i, v in enumerate(prem_values, start=1)}
+        self.final_axis = np.asarray(final_values, dtype='float64')
+        self.sar_axis = np.asarray(sar_values, dtype='float64')
+        self.prem_axis = np.asarray(prem_values, dtype='float64')
+
+        self.category_labels: List[Optional[str]] = [None]
+        category_codes = np.zeros(len(final_values) + 1, dtype=np.int16)
+        for i, final in enumerate(final_values, start=1):
+            category_codes[i] = self._code(self.category_labels, match_category(final, categories))
+        self.category_codes = category_codes
+
+        self.flag_labels: List[Optional[str]] = [DEFAULT_FLAG]
+        flag_codes = np.zeros((len(final_values) + 1, len(sar_values) + 1, len(prem_values) + 1), dtype=np.int16)
+        for i, final in enumerate(final_values, start=1):
+            for j, sar in enumerate([None] + sar_values):
+                for k, prem in enumerate([None] + prem_values):
+                    flag_codes[i, j, k] = self._code(self.flag_labels, match_flag(final, sar, prem, flags))
+        self.flag_codes = flag_codes
+
+        # Load-time coverage report: reachable scores that no rule addresses
+        self.uncovered_categories = [f for f in final_values if match_category(f, categories) is None]
+        self.uncovered_flags = sorted(
+            combo for combo in reachable
+            if not any(_conditions_hold(rule.get('when', {}), *combo) for rule in flags)
+        )
+
+    @staticmethod
+    def _code(labels: List[Optional[str]], label: Optional[str]) -> int:
+        if label not in labels:
+            labels.append(label)
+        return labels.index(label)
+
+    @staticmethod
+    def _axis_index(axis: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Map values to table indices (axis position + 1, 0 for NaN) and mark values on the axis."""
+        missing = np.isnan(values)
+        if not axis.size:
+            return np.zeros(values.shape, dtype=np.intp), missing
+        pos = np.minimum(np.searchsorted(axis, values), axis.size - 1)
+        found = missing | (axis[pos] == values)
+        return np.where(found & ~missing, pos + 1, 0), found
+
+    def report(self) -> None:
+        """Log reachable score combinations that fall through the decision rules."""
+        if self.uncovered_categories:
+            logger.warning(f"Final scores without a risk category: {self.uncovered_categories}")
+        if self.uncovered_flags:
+            sample = ', '.join(f"(final={f}, sar={s}, premium={p})" for f, s, p in self.uncovered_flags[:10])
+            more = f" and {len(self.uncovered_flags) - 10} more" if len(self.uncovered_flags) > 10 else ''
+            logger.info(
+                f"{len(self.uncovered_flags)} reachable score combinations match no underwriting flag rule "
+                f"and default to '{DEFAULT_FLAG}': {sample}{more}"
+            )
+
+    def resolve(self, final: Optional[int], sar, prem) -> Tuple[Optional[str], str]:
+        """Resolve category and flag for one proposal's scores (None = missing)."""
+        if final is None:
+            return None, DEFAULT_FLAG
+        fi = self.final_positions.get(final)
+        si = 0 if sar is None else self.sar_positions.get(sar)
+        pi = 0 if prem is None else self.prem_positions.get(prem)
+        if fi is None or si is None or pi is None:
+            return match_category(final, self.categories), match_flag(final, sar, prem, self.flags)
+        return self.category_labels[self.category_codes[fi]], self.flag_labels[self.flag_codes[fi, si, pi]]
+
+    def lookup(self, final: np.ndarray, sar: np.ndarray, prem: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Resolve category and flag for float64 score arrays (NaN = missing).
+
+        Returns object arrays of categories and flags plus a boolean mask of the
+        rows the table could resolve.
+        """
+        fi, f_found = self._axis_index(self.final_axis, final)
+        si, s_found = self._axis_index(self.sar_axis, sar)
+        pi, p_found = self._axis_index(self.prem_axis, prem)
+        resolved = f_found & (np.isnan(final) | (s_found & p_found))
+        categories = np.array(self.category_labels, dtype=object)[self.category_codes[fi]]
+        flags = np.array(self.flag_labels, dtype=object)[self.flag_codes[fi, si, pi]]
+        return categories, flags, resolved
+
+
+class CompiledRuleset:
+    """One version of a rules file, parsed and compiled for scoring.
+
+    Holds the raw rules dict alongside the compiled forms the engine uses:
+    per-component ``CompiledBands``, the (SAR, TSAR, Premium) weight vector and
+    the ``DecisionTable`` (None when the decisions block cannot be compiled).
+    The compiled content never changes once built, so instances are shared
+    between calculators.
+    """
+
+    def __init__(self, rules: Dict[str, Any], path: Optional[str] = None,
+                 digest: Optional[str] = None, stat: Optional[os.stat_result] = None):
+        if not rules or not isinstance(rules, dict):
+            raise ValueError("Rules YAML is empty or invalid")
+        self.rules = rules
+        self.path = path
+        self.digest = digest
+        self.stat_key = (stat.st_mtime_ns, stat.st_size) if stat else None
+        self.weights = np.array(component_weights(rules), dtype='float64')
+        if not np.isclose(self.weights.sum(), 1.0):
+            logger.warning(f"Component weights sum to {self.weights.sum():g}, expected 1.0")
+        components = rules.get('components') or {}
+        self.bands = {name: CompiledBands(components.get(name, [])) for name in COMPONENTS}
+        for name, bands in components.items():
+            self.bands.setdefault(name, CompiledBands(bands))
+        try:
+            self.decision_table: Optional[DecisionTable] = DecisionTable(rules, self.bands)
+        except Exception as e:
+            logger.warning(f"Could not compile decision table; using row-wise decisions: {e}")
+            self.decision_table = None
+        else:
+            logger.info(f"Compiled decision table with shape {self.decision_table.flag_codes.shape}")
+            self.decision_table.report()
+
+    def score_ratios(self, sar_ratio: np.ndarray, tsar_ratio: np.ndarray,
+                     premium_ratio: np.ndarray) -> Dict[str, np.ndarray]:
+        """Score float64 ratio arrays (NaN = missing) under this ruleset.
+
+        Returns float64 component and final scores (NaN = missing) and object
+        arrays of risk categories and underwriting flags, with the same
+        first-match semantics as the engine. Rows the decision table cannot
+        resolve fall back to the row-wise rules.
+        """
+        sar = self.bands['sar_income_ratio'].lookup(sar_ratio)
+        tsar = self.bands['tsar_income_ratio'].lookup(tsar_ratio)
+        prem = self.bands['premium_income_ratio'].lookup(premium_ratio)
+        w_sar, w_tsar, w_prem = self.weights.tolist()
+        final = np.round(sar * w_sar + tsar * w_tsar + prem * w_prem)
+        if self.decision_table is not None:
+            categories, flags, resolved = self.decision_table.lookup(final, sar, prem)
+        else:
+            categories = np.full(final.shape, None, dtype=object)
+            flags = np.full(final.shape, DEFAULT_FLAG, dtype=object)
+            resolved = np.isnan(final)
+        decisions = self.rules.get('decisions', {})
+        for i in np.flatnonzero(~resolved).tolist():
+            if np.isnan(final[i]):
+                categories[i], flags[i] = None, DEFAULT_FLAG
+                continue
+            s = None if np.isnan(sar[i]) else sar[i]
+            p = None if np.isnan(prem[i]) else prem[i]
+            categories[i] = match_category(int(final[i]), decisions.get('risk_categories', []))
+            flags[i] = match_flag(int(final[i]), s, p, decisions.get('underwriting_flags', []))
+        return {
+            'sar_score': sar,
+            'tsar_score': tsar,
+            'premium_score': prem,
+            'final_finance_score': final,
+            'risk_category': categories,
+            'underwriting_flag': flags,
+        }
+
+
+_RULESETS: Dict[str, CompiledRuleset] = {}
+_RULESETS_LOCK = threading.Lock()
+
+
+def load_ruleset(path: str) -> CompiledRuleset:
+    """Return the compiled ruleset for ``path``, recompiling only when the file changes.
+
+    The cache is keyed by absolute path; a version is identified by mtime and
+    size first and by SHA-256 of the content when those move, so touching the
+    file without editing it does not trigger a recompile. A new version is
+    swapped in only after it compiles; if an edited file fails to parse, the
+    previous version keeps serving and the error is logged.
+    """
+    path = os.path.abspath(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Rules YAML not found at {path}")
+    stat = os.stat(path)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+    cached = _RULESETS.get(path)
+    if cached is not None and cached.stat_key == stat_key:
+        return cached
+    with _RULESETS_LOCK:
+        cached = _RULESETS.get(path)
+        if cached is not None and cached.stat_key == stat_key:
+            return cached
+        with open(path, 'rb') as fh:
+            raw = fh.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached is not None and cached.digest == digest:
+            cached.stat_key = stat_key
+            return cached
+        try:
+            ruleset = CompiledRuleset(yaml.safe_load(raw.decode('utf-8')), path, digest, stat)
+        except Exception:
+            if cached is None:
+                raise
+            logger.error(f"Failed to reload rules from {path}; keeping previous version", exc_info=True)
+            cached.stat_key = stat_key
+            return cached
+        _RULESETS[path] = ruleset
+        logger.info(f"Compiled rules from {path} (sha256 {digest[:12]})")
+        return ruleset
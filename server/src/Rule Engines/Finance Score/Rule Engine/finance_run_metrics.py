@@ -0,0 +1,208 @@
+"""Per-stage timing and counters for finance pipeline runs.
+
+``RunMetrics`` accumulates, per named stage (extract, compute_component_scores,
+apply_decisions, export_scores, ...), the wall time, CPU time, rows handled
+and the process peak RSS seen at the end of the stage. Chunked runs add up
+every chunk under the same stage; parallel workers return their stages and
+the parent merges them, so their wall and CPU times are worker-seconds.
+
+At the end of a run the totals are written to
+``run_manifest_<HHMMSS>-<pid>.json`` in the dated output folder (one file per
+run, named by its start time and process id, so several runs on the same
+day each keep theirs) and, when FIN_METRICS_TEXTFILE names a file, to a
+Prometheus textfile-collector file (written atomically, as node_exporter
+expects).
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:
+    # Windows: peak RSS is not reported
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Formatted with the run's start time and pid (see RunMetrics.run_id)
+MANIFEST_NAME = 'run_manifest_{run_id}.json'
+METRIC_PREFIX = 'finance_pipeline'
+
+# Env flags recorded in the manifest so runs can be compared like for like
+CONFIG_ENV = (
+    'FIN_CHUNK_SIZE', 'FIN_WORKERS', 'FIN_INCREMENTAL', 'FIN_VECTORIZED', 'FIN_BATCH_INVARIANT', 'FIN_DEDUP',
+    'FIN_PROJECTION', 'FIN_EXPLAIN', 'FIN_ARTIFACT_STORE', 'FIN_WRITEBACK', 'FIN_EXTRACT_MODE', 'FIN_COMPACT_DTYPES',
+)
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident set size of this process (or its finished children), or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _children_cpu_seconds() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class RunMetrics:
+    """Stage timings and counters of one pipeline run."""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = _children_cpu_seconds()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        # Dated folder the manifest belongs in; set once the run's calculator picks it
+        self.output_dir: Optional[str] = None
+        # Tells apart the manifests of runs sharing a dated folder
+        self.run_id = f"{self.started_at.strftime('%H%M%S')}-{os.getpid()}"
+
+    def _totals(self, name: str) -> Dict[str, Any]:
+        return self.stages.setdefault(name, {'calls': 0, 'rows': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_bytes': None})
+
+    def add(self, name: str, wall: float, cpu: float, rows: int, peak_rss: Optional[int], calls: int = 1) -> None:
+        totals = self._totals(name)
+        totals['calls'] += calls
+        totals['rows'] += rows
+        totals['wall_seconds'] += wall
+        totals['cpu_seconds'] += cpu
+        if peak_rss is not None:
+            totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'] or 0, peak_rss)
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0) -> Iterator[Dict[str, int]]:
+        """Time the block as one call of stage ``name``; set ``counter['rows']`` inside when not known up front."""
+        counter = {'rows': rows}
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield counter
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, counter['rows'], peak_rss_bytes())
+
+    def iterate(self, name: str, frames: Iterable) -> Iterator:
+        """Yield from ``frames``, timing each ``next()`` that returns a frame as a call of stage ``name``.
+
+        Rows are ``len(frame)``. The time of the final, exhausted ``next()`` is
+        added to the stage without counting it as a call.
+        """
+        iterator = iter(frames)
+        while True:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                frame = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - wall, time.process_time() - cpu, 0, peak_rss_bytes(), calls=0)
+                return
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, len(frame), peak_rss_bytes())
+            yield frame
+
+    def merge(self, stages: Dict[str, Dict[str, Any]]) -> None:
+        """Add the stages recorded by another process (a parallel worker)."""
+        for name, totals in stages.items():
+            self.add(name, totals['wall_seconds'], totals['cpu_seconds'], totals['rows'], totals['peak_rss_bytes'], totals['calls'])
+
+    def manifest(self, exit_code: Optional[int] = None) -> Dict[str, Any]:
+        """The run manifest: run totals, the config flags in effect and every stage with its rows/sec."""
+        wall = time.perf_counter() - self._wall
+        stages = {}
+        for name, totals in self.stages.items():
+            seconds = totals['wall_seconds']
+            stages[name] = dict(totals, rows_per_sec=round(totals['rows'] / seconds, 1) if seconds else None)
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'exit_code': exit_code,
+            'run_id': self.run_id,
+            'pid': os.getpid(),
+            'wall_seconds': wall,
+            'cpu_seconds': time.process_time() - self._cpu,
+            'children_cpu_seconds': _children_cpu_seconds() - self._children_cpu,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'children_peak_rss_bytes': peak_rss_bytes(children=True),
+            'config': {name: os.environ[name] for name in CONFIG_ENV if name in os.environ},
+            'stages': stages,
+        }
+
+    def write_manifest(self, output_dir: str, manifest: Dict[str, Any]) -> str:
+        """Write ``manifest`` as this run's run_manifest_<run_id>.json in ``output_dir``; returns its path."""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, MANIFEST_NAME.format(run_id=self.run_id))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(manifest, fh, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def prometheus_text(manifest: Dict[str, Any]) -> str:
+        """Render ``manifest`` as Prometheus text exposition (gauges, one series per stage)."""
+        run_gauges = {
+            'run_wall_seconds': ('Wall time of the last run', manifest['wall_seconds']),
+            'run_cpu_seconds': ('CPU time of the last run, including worker processes',
+                                manifest['cpu_seconds'] + manifest['children_cpu_seconds']),
+            'run_peak_rss_bytes': ('Peak RSS of the last run\'s main process', manifest['peak_rss_bytes']),
+            'run_exit_code': ('Exit code of the last run', manifest['exit_code']),
+            'run_finished_timestamp_seconds': ('Unix time the last run finished',
+                                               datetime.fromisoformat(manifest['finished_at']).timestamp()),
+        }
+        stage_gauges = {
+            'stage_wall_seconds': ('Wall time per stage of the last run', 'wall_seconds'),
+            'stage_cpu_seconds': ('CPU time per stage of the last run', 'cpu_seconds'),
+            'stage_rows': ('Rows handled per stage of the last run', 'rows'),
+            'stage_rows_per_second': ('Rows per wall second per stage of the last run', 'rows_per_sec'),
+            'stage_peak_rss_bytes': ('Process peak RSS at the end of each stage of the last run', 'peak_rss_bytes'),
+        }
+        lines = []
+        for name, (help_text, value) in run_gauges.items():
+            if value is None:
+                continue
+            lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} gauge",
+                      f"{METRIC_PREFIX}_{name} {value}"]
+        for name, (help_text, key) in stage_gauges.items():
+            lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} gauge"]
+            for stage, totals in manifest['stages'].items():
+                if totals[key] is not None:
+                    lines.append(f'{METRIC_PREFIX}_{name}{{stage="{stage}"}} {totals[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, manifest: Dict[str, Any]) -> None:
+        """Atomically replace the textfile-collector file ``path`` with this run's gauges."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            fh.write(self.prometheus_text(manifest))
+        os.replace(tmp_path, path)
+
+    def finish(self, exit_code: Optional[int], output_dir: Optional[str] = None) -> Dict[str, Any]:
+        """Log the stage table and write the manifest (and Prometheus file, if FIN_METRICS_TEXTFILE is set)."""
+        manifest = self.manifest(exit_code)
+        for name, totals in manifest['stages'].items():
+            rate = f"{totals['rows_per_sec']:.0f} rows/s" if totals['rows_per_sec'] is not None else "-"
+            logger.info(f"Stage {name}: {totals['rows']} rows in {totals['wall_seconds']:.2f}s wall, "
+                        f"{totals['cpu_seconds']:.2f}s CPU ({rate}, {totals['calls']} calls)")
+        output_dir = output_dir or self.output_dir
+        if output_dir:
+            logger.info(f"Run manifest written to {self.write_manifest(output_dir, manifest)}")
+        textfile = os.environ.get('FIN_METRICS_TEXTFILE')
+        if textfile:
+            self.write_prometheus(textfile, manifest)
+            logger.info(f"Prometheus metrics written to {textfile}")
+        return manifest
@@ -0,0 +1,98 @@
+"""Pandas-free scoring of a single proposal.
+
+Scores one input dict with plain Python arithmetic against the same compiled
+rules the DataFrame engine uses (see finance_rules) and returns the record
+``FinanceScoreCalculator.export_per_proposal`` writes for that proposal when
+it is scored on its own. Used by calculate_single_score.py and the persistent
+finance_score_worker.py, which then never import pandas.
+check_scalar_parity.py verifies both paths agree.
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+try:
+    from finance_rules import CompiledRuleset, DEFAULT_FLAG, load_ruleset, match_category, match_flag, resolve_rules_path
+except ImportError:
+    from .finance_rules import CompiledRuleset, DEFAULT_FLAG, load_ruleset, match_category, match_flag, resolve_rules_path
+
+
+def to_float_safe(x) -> Optional[float]:
+    """Coerce an amount to a non-negative float; None when missing or invalid."""
+    try:
+        if x is None or (isinstance(x, float) and math.isnan(x)):
+            return None
+        if isinstance(x, str):
+            x = x.replace(',', '').strip()
+        val = float(x)
+        return val if val >= 0 else None
+    except Exception:
+        return None
+
+
+def _ratio(numerator: Optional[float], income: Optional[float]) -> Optional[float]:
+    if income is None or income <= 0 or numerator is None:
+        return None
+    return numerator / income
+
+
+def score_proposal(data: Dict[str, Any], ruleset: Optional[CompiledRuleset] = None) -> Dict[str, Any]:
+    """Score one proposal dict and return its per-proposal output record.
+
+    ``ruleset`` defaults to the cached compile of the configured rules file
+    (FIN_RULES_YAML or the bundled YAML), so edits are picked up between calls.
+    """
+    if ruleset is None:
+        ruleset = load_ruleset(resolve_rules_path())
+    income = to_float_safe(data.get('annual_income'))
+    premium = to_float_safe(data.get('premium'))
+    sum_assured = to_float_safe(data.get('sum_assured'))
+    other_sum_assured = to_float_safe(data.get('other_insurance_sum_assured'))
+
+    sar_ratio = _ratio(sum_assured, income)
+    tsar_ratio = _ratio(None if other_sum_assured is None or sum_assured is None else sum_assured + other_sum_assured, income)
+    premium_ratio = _ratio(premium, income)
+
+    bands = ruleset.bands
+    sar_score = None if sar_ratio is None else bands['sar_income_ratio'].score(sar_ratio)
+    tsar_score = None if tsar_ratio is None else bands['tsar_income_ratio'].score(tsar_ratio)
+    premium_score = None if premium_ratio is None else bands['premium_income_ratio'].score(premium_ratio)
+
+    w_sar, w_tsar, w_prem = ruleset.weights.tolist()
+    if sar_score is None or tsar_score is None or premium_score is None:
+        final_score = None
+    else:
+        final_score = int(round(sar_score * w_sar + tsar_score * w_tsar + premium_score * w_prem))
+
+    factors: List[Dict[str, Any]] = [
+        {'feature': 'sar_income_ratio', 'score': sar_score, 'weight': w_sar, 'contribution': (sar_score or 0) * w_sar},
+        {'feature': 'tsar_income_ratio', 'score': tsar_score, 'weight': w_tsar, 'contribution': (tsar_score or 0) * w_tsar},
+        {'feature': 'premium_income_ratio', 'score': premium_score, 'weight': w_prem, 'contribution': (premium_score or 0) * w_prem},
+    ]
+    factors.sort(key=lambda x: x['contribution'], reverse=True)
+
+    if ruleset.decision_table is not None:
+        category, flag = ruleset.decision_table.resolve(final_score, sar_score, premium_score)
+    elif final_score is None:
+        category, flag = None, DEFAULT_FLAG
+    else:
+        decisions = ruleset.rules.get('decisions', {})
+        category = match_category(final_score, decisions.get('risk_categories', []))
+        flag = match_flag(final_score, sar_score, premium_score, decisions.get('underwriting_flags', []))
+
+    amounts = {'annual_income': income, 'premium': premium, 'sum_assured': sum_assured}
+    return {
+        'proposal_number': data.get('proposal_number'),
+        'proposer_id': data.get('proposer_id'),
+        'sar_income_ratio': sar_ratio,
+        'tsar_income_ratio': tsar_ratio,
+        'premium_income_ratio': premium_ratio,
+        'sar_score': sar_score,
+        'tsar_score': tsar_score,
+        'premium_score': premium_score,
+        'final_finance_score': final_score,
+        'risk_category': category,
+        'underwriting_flag': flag,
+        'score_factors': factors,
+        'validation_issues': [f"missing_{col}" for col, value in amounts.items() if value is None],
+    }
@@ -8,118 +8,303 @@ artifacts for auditability and downstream consumption.
 
 import os
 import json
+import numpy as np
 import pandas as pd
 import logging
-from typing import Dict, Any, List
+from contextlib import nullcontext
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-import yaml
+try:
+    from finance_rules import CompiledBands, CompiledRuleset, DecisionTable, load_ruleset, match_band, match_category, match_flag, resolve_rules_path
+    from finance_artifact_store import PackedArtifactStore, resolve_artifact_store
+    from finance_scalar import to_float_safe
+except ImportError:
+    from .finance_rules import CompiledBands, CompiledRuleset, DecisionTable, load_ruleset, match_band, match_category, match_flag, resolve_rules_path
+    from .finance_artifact_store import PackedArtifactStore, resolve_artifact_store
+    from .finance_scalar import to_float_safe
 
 logger = logging.getLogger(__name__)
 
+AMOUNT_COLUMNS = ['annual_income', 'premium', 'sum_assured', 'other_insurance_sum_assured']
+
+# Row identifiers; every other input column is part of the feature vector deduplicated on
+ID_COLUMNS = ['proposal_number', 'proposer_id']
+
+# Fields of the per-proposal output record, in export order
+OUTPUT_FIELDS = [
+    'proposal_number', 'proposer_id',
+    'sar_income_ratio', 'tsar_income_ratio', 'premium_income_ratio',
+    'sar_score', 'tsar_score', 'premium_score', 'final_finance_score',
+    'risk_category', 'underwriting_flag', 'score_factors', 'validation_issues',
+]
+
+# Explainability features and the score column each is weighted from, in tie-break order
+FACTOR_FEATURES = [
+    ('sar_income_ratio', 'sar_score'),
+    ('tsar_income_ratio', 'tsar_score'),
+    ('premium_income_ratio', 'premium_score'),
+]
+
+# 'lazy' keeps score_factors compact until export, 'eager' adds the column in calculate(), 'off' skips them
+EXPLAIN_MODES = ('lazy', 'eager', 'off')
+
+
+def _column_values(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Return a column as a float64 array with NaN for missing values."""
+    return df[col].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def amount_values(df: pd.DataFrame, col: str) -> np.ndarray:
+    """An amount column as float64, NaN where missing, unparsable or negative (as _preprocess cleans it)."""
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    if pd.api.types.is_numeric_dtype(df[col]):
+        values = _column_values(df, col)
+    else:
+        values = np.array([np.nan if v is None else v for v in map(to_float_safe, df[col].tolist())], dtype='float64')
+    with np.errstate(invalid='ignore'):
+        return np.where(values >= 0, values, np.nan)
+
+
+def _guarded_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide where the denominator is positive and the numerator present, else NaN."""
+    out = np.full(numerator.shape, np.nan)
+    ok = (denominator > 0) & ~np.isnan(numerator)
+    np.divide(numerator, denominator, out=out, where=ok)
+    return out
+
+
+def _as_applied(values: np.ndarray, index: pd.Index, integral: bool = False, batch_invariant: bool = False) -> pd.Series:
+    """Wrap a float64/NaN result with the dtype Series.apply infers for the row-wise path.
+
+    All-missing columns hold None (object dtype), complete integral columns are
+    int64, anything else stays float64 with NaN. With ``batch_invariant`` every
+    row instead gets the value it would have if scored on its own (None when
+    missing, int for integral bands), so output does not depend on which other
+    rows share the frame.
+    """
+    missing = np.isnan(values)
+    if batch_invariant:
+        out = np.full(len(values), None, dtype=object)
+        present = values[~missing]
+        out[~missing] = (present.astype('int64') if integral else present).tolist()
+        return pd.Series(out, index=index, dtype=object)
+    if missing.all():
+        return pd.Series([None] * len(values), index=index, dtype=object)
+    if integral and not missing.any():
+        return pd.Series(values.astype('int64'), index=index)
+    return pd.Series(values, index=index)
+
+
+def factor_contributions(df: pd.DataFrame, weights: List[float]) -> np.ndarray:
+    """The (rows x 3) weighted score contributions of FACTOR_FEATURES.
+
+    A missing score contributes 0 when it is None and NaN when it is NaN,
+    as ``(score or 0) * weight`` does on the row-wise path.
+    """
+    contributions = np.empty((len(df), len(FACTOR_FEATURES)))
+    for j, (_, col) in enumerate(FACTOR_FEATURES):
+        values = _column_values(df, col)
+        if df[col].dtype == object:
+            values[df[col].map(lambda v: v is None).to_numpy(dtype=bool)] = 0.0
+        contributions[:, j] = values * weights[j]
+    return contributions
+
+
+def factor_order(contributions: np.ndarray) -> np.ndarray:
+    """Column indices of each row's contributions, largest first.
+
+    Ties keep feature order, like the stable ``sort(reverse=True)`` of the
+    row-wise path. NaN compares false both ways, so rows mixing NaN with
+    numbers are ordered by that same sort; all-NaN rows keep feature order.
+    """
+    order = np.argsort(-contributions, axis=1, kind='stable')
+    missing = np.isnan(contributions)
+    for i in np.flatnonzero(missing.any(axis=1) & ~missing.all(axis=1)).tolist():
+        row = contributions[i].tolist()
+        order[i] = sorted(range(len(row)), key=row.__getitem__, reverse=True)
+    return order
+
+
 class FinanceScoreCalculator:
-    def __init__(self, rules_path: str = None, output_dir: str = None):
+    def __init__(self, rules_path: str = None, output_dir: str = None, vectorized: Optional[bool] = None,
+                 batch_invariant: Optional[bool] = None, dedup: Optional[bool] = None,
+                 artifact_store: Optional[str] = None, projection: Optional[bool] = None,
+                 explain: Optional[str] = None, metrics=None):
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        default_rules = os.path.join(base_dir, 'finance_score_rules.yaml')
         default_output = os.path.join(base_dir, 'finance_scores')
-        self.rules_path = rules_path or os.environ.get('FIN_RULES_YAML', default_rules)
+        self.rules_path = resolve_rules_path(rules_path)
         base_output = output_dir or os.environ.get('FIN_OUTPUT_DIR', default_output)
         # Structured output: base/YYYYMMDD/
         date_folder = datetime.now().strftime('%Y%m%d')
         self.output_root = base_output
         self.output_dir = os.path.join(base_output, date_folder)
-        os.makedirs(self.output_dir, exist_ok=True)
-        self.rules = self._load_rules()
+        # Parsed and compiled once per process and file version (see finance_rules.load_ruleset)
+        self.ruleset = load_ruleset(self.rules_path)
+        # Columnar NumPy scoring (default); FIN_VECTORIZED=false keeps the row-wise path
+        if vectorized is None:
+            vectorized = os.environ.get('FIN_VECTORIZED', 'true').lower() == 'true'
+        self.vectorized = vectorized
+        # Per-row values independent of the batch a row is scored in (sharded/parallel runs); records are
+        # then serialized as for a one-row batch: null for missing values, integral band scores as ints
+        if batch_invariant is None:
+            batch_invariant = os.environ.get('FIN_BATCH_INVARIANT', 'false').lower() == 'true'
+        self.batch_invariant = batch_invariant
+        if batch_invariant and not vectorized:
+            logger.warning("FIN_BATCH_INVARIANT only applies to the vectorized path; row-wise output dtypes still depend on the batch")
+        # Score each distinct feature vector once and broadcast to its proposals
+        if dedup is None:
+            dedup = os.environ.get('FIN_DEDUP', 'false').lower() == 'true'
+        self.dedup = dedup
+        # 'files' (one JSON per proposal) or 'packed' (see finance_artifact_store)
+        self.artifact_store = resolve_artifact_store(artifact_store)
+        self._packed_store: Optional[PackedArtifactStore] = None
+        # Score only the id and amount columns, without full-frame copies, and return just OUTPUT_FIELDS
+        if projection is None:
+            projection = os.environ.get('FIN_PROJECTION', 'false').lower() == 'true'
+        self.projection = projection
+        explain = (explain or os.environ.get('FIN_EXPLAIN', 'lazy')).lower()
+        if explain not in EXPLAIN_MODES:
+            raise ValueError(f"Unknown explain mode {explain!r}; expected one of {', '.join(EXPLAIN_MODES)}")
+        self.explain = explain
+        # Optional finance_run_metrics.RunMetrics that times each scoring and export stage
+        self.metrics = metrics
         logger.info(f"Loaded rules from {self.rules_path}")
         logger.info(f"Output directory set to {self.output_dir}")
 
+    @property
+    def rules(self) -> Dict[str, Any]:
+        return self.ruleset.rules
+
+    @property
+    def compiled_bands(self) -> Dict[str, CompiledBands]:
+        return self.ruleset.bands
+
+    @property
+    def decision_table(self) -> Optional[DecisionTable]:
+        return self.ruleset.decision_table
+
     def _load_rules(self) -> Dict[str, Any]:
-        if not os.path.exists(self.rules_path):
-            raise FileNotFoundError(f"Rules YAML not found at {self.rules_path}")
-        with open(self.rules_path, 'r', encoding='utf-8') as fh:
-            data = yaml.safe_load(fh)
-        if not data:
-            raise ValueError("Rules YAML is empty or invalid")
-        return data
+        return load_ruleset(self.rules_path).rules
+
+    def _refresh_rules(self) -> CompiledRuleset:
+        """Swap in the current compiled ruleset if the rules file has changed."""
+        ruleset = load_ruleset(self.rules_path)
+        if ruleset is not self.ruleset:
+            logger.info(f"Rules file changed; reloaded {self.rules_path}")
+            self.ruleset = ruleset
+        return ruleset
 
     def _preprocess(self, df: pd.DataFrame) -> pd.DataFrame:
-        def to_float_safe(x):
-            try:
-                if pd.isna(x):
-                    return None
-                if isinstance(x, str):
-                    x = x.replace(',', '').strip()
-                val = float(x)
-                return val if val >= 0 else None
-            except Exception:
-                return None
-        df = df.copy()
-        for col in ['annual_income', 'premium', 'sum_assured', 'other_insurance_sum_assured']:
-            if col in df.columns:
+        if not self.projection:
+            df = df.copy()
+        for col in AMOUNT_COLUMNS:
+            if col not in df.columns:
+                continue
+            if self.vectorized and pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = _as_applied(amount_values(df, col), df.index)
+            else:
                 df[col] = df[col].apply(to_float_safe)
         if 'occupation' in df.columns:
-            df['occupation'] = df['occupation'].astype(str).str.strip().str.lower()
+            if isinstance(df['occupation'].dtype, pd.CategoricalDtype):
+                # Compact schema: normalise each category label once, not every row
+                df['occupation'] = df['occupation'].map(lambda v: str(v).strip().lower())
+            else:
+                df['occupation'] = df['occupation'].astype(str).str.strip().str.lower()
         return df
 
     def _score_from_bands(self, value, bands):
         if value is None or pd.isna(value):
             return None
-        for band in bands:
-            min_v = band.get('min', None)
-            max_v = band.get('max', None)
-            inclusive_max = band.get('inclusive_max', True)
-            score = band['score']
-            ok_min = True if min_v is None else (value >= min_v)
-            if max_v is None:
-                ok_max = True
-            else:
-                ok_max = (value <= max_v) if inclusive_max else (value < max_v)
-            if ok_min and ok_max:
-                return score
-        return None
+        return match_band(value, bands)
+
+    def _score_column(self, ratios: pd.Series, component: str) -> pd.Series:
+        """Score a whole ratio column against a component's compiled bands."""
+        compiled = self.compiled_bands.get(component) or CompiledBands([])
+        values = ratios.to_numpy(dtype='float64', na_value=np.nan)
+        return _as_applied(compiled.lookup(values), ratios.index, compiled.integral, self.batch_invariant)
 
     def _compute_component_scores(self, df: pd.DataFrame) -> pd.DataFrame:
-        rules = self.rules
-        weights = rules.get('weights', {})
-        components = rules.get('components', {})
+        components = self.rules.get('components', {})
 
         df = self._preprocess(df)
         logger.info("Computing SAR/TSAR/Premium ratios")
-        df['sar_income_ratio'] = df.apply(lambda r: (r['sum_assured'] / r['annual_income']) if (pd.notna(r['annual_income']) and r['annual_income'] > 0 and pd.notna(r['sum_assured'])) else None, axis=1)
-        df['tsar_income_ratio'] = df.apply(lambda r: ((r['sum_assured'] + r['other_insurance_sum_assured']) / r['annual_income']) if (pd.notna(r['annual_income']) and r['annual_income'] > 0 and pd.notna(r['sum_assured']) and pd.notna(r['other_insurance_sum_assured'])) else None, axis=1)
-        df['premium_income_ratio'] = df.apply(lambda r: (r['premium'] / r['annual_income']) if (pd.notna(r['annual_income']) and r['annual_income'] > 0 and pd.notna(r['premium'])) else None, axis=1)
+        if self.vectorized:
+            income = _column_values(df, 'annual_income')
+            sum_assured = _column_values(df, 'sum_assured')
+            other_sum_assured = _column_values(df, 'other_insurance_sum_assured')
+            premium = _column_values(df, 'premium')
+            df['sar_income_ratio'] = _as_applied(_guarded_ratio(sum_assured, income), df.index, batch_invariant=self.batch_invariant)
+            df['tsar_income_ratio'] = _as_applied(_guarded_ratio(sum_assured + other_sum_assured, income), df.index, batch_invariant=self.batch_invariant)
+            df['premium_income_ratio'] = _as_applied(_guarded_ratio(premium, income), df.index, batch_invariant=self.batch_invariant)
+        else:
+            df['sar_income_ratio'] = df.apply(lambda r: (r['sum_assured'] / r['annual_income']) if (pd.notna(r['annual_income']) and r['annual_income'] > 0 and pd.notna(r['sum_assured'])) else None, axis=1)
+            df['tsar_income_ratio'] = df.apply(lambda r: ((r['sum_assured'] + r['other_insurance_sum_assured']) / r['annual_income']) if (pd.notna(r['annual_income']) and r['annual_income'] > 0 and pd.notna(r['sum_assured']) and pd.notna(r['other_insurance_sum_assured'])) else None, axis=1)
+            df['premium_income_ratio'] = df.apply(lambda r: (r['premium'] / r['annual_income']) if (pd.notna(r['annual_income']) and r['annual_income'] > 0 and pd.notna(r['premium'])) else None, axis=1)
 
         sar_bands = components.get('sar_income_ratio', [])
         tsar_bands = components.get('tsar_income_ratio', [])
         premium_bands = components.get('premium_income_ratio', [])
 
         logger.info("Scoring components using YAML bands")
-        df['sar_score'] = df['sar_income_ratio'].apply(lambda v: self._score_from_bands(v, sar_bands))
-        df['tsar_score'] = df['tsar_income_ratio'].apply(lambda v: self._score_from_bands(v, tsar_bands))
-        df['premium_score'] = df['premium_income_ratio'].apply(lambda v: self._score_from_bands(v, premium_bands))
+        if self.vectorized:
+            df['sar_score'] = self._score_column(df['sar_income_ratio'], 'sar_income_ratio')
+            df['tsar_score'] = self._score_column(df['tsar_income_ratio'], 'tsar_income_ratio')
+            df['premium_score'] = self._score_column(df['premium_income_ratio'], 'premium_income_ratio')
+        else:
+            df['sar_score'] = df['sar_income_ratio'].apply(lambda v: self._score_from_bands(v, sar_bands))
+            df['tsar_score'] = df['tsar_income_ratio'].apply(lambda v: self._score_from_bands(v, tsar_bands))
+            df['premium_score'] = df['premium_income_ratio'].apply(lambda v: self._score_from_bands(v, premium_bands))
 
-        w_sar = float(weights.get('sar_income_ratio', 0.5))
-        w_tsar = float(weights.get('tsar_income_ratio', 0.25))
-        w_prem = float(weights.get('premium_income_ratio', 0.25))
+        w_sar, w_tsar, w_prem = self.ruleset.weights.tolist()
         logger.info(f"Applying weights: SAR={w_sar}, TSAR={w_tsar}, Premium={w_prem}")
 
-        df['weighted_score'] = (
-            df['sar_score'].astype('float') * w_sar +
-            df['tsar_score'].astype('float') * w_tsar +
-            df['premium_score'].astype('float') * w_prem
-        )
-        df['final_finance_score'] = df['weighted_score'].round().astype('Int64')
-
-        def top_factors(row) -> List[Dict[str, Any]]:
-            parts = []
-            parts.append({'feature': 'sar_income_ratio', 'score': row.get('sar_score'), 'weight': w_sar, 'contribution': (row.get('sar_score') or 0) * w_sar})
-            parts.append({'feature': 'tsar_income_ratio', 'score': row.get('tsar_score'), 'weight': w_tsar, 'contribution': (row.get('tsar_score') or 0) * w_tsar})
-            parts.append({'feature': 'premium_income_ratio', 'score': row.get('premium_score'), 'weight': w_prem, 'contribution': (row.get('premium_score') or 0) * w_prem})
-            parts.sort(key=lambda x: x['contribution'], reverse=True)
-            return parts[:3]
-        df['score_factors'] = df.apply(top_factors, axis=1)
+        if self.vectorized:
+            weighted = pd.Series(
+                _column_values(df, 'sar_score') * w_sar +
+                _column_values(df, 'tsar_score') * w_tsar +
+                _column_values(df, 'premium_score') * w_prem,
+                index=df.index,
+            )
+        else:
+            weighted = (
+                df['sar_score'].astype('float') * w_sar +
+                df['tsar_score'].astype('float') * w_tsar +
+                df['premium_score'].astype('float') * w_prem
+            )
+        if not self.projection:
+            df['weighted_score'] = weighted
+        df['final_finance_score'] = weighted.round().astype('Int64')
+
+        # The score columns and weights are the compact explainability; expanded at export
+        df.attrs['factor_weights'] = [w_sar, w_tsar, w_prem]
+        if self.explain == 'eager':
+            df['score_factors'] = self.score_factors(df)
         return df
 
+    def factor_weights(self, df: pd.DataFrame) -> List[float]:
+        """The (SAR, TSAR, Premium) weights ``df`` was scored with, else the current ruleset's."""
+        return df.attrs.get('factor_weights') or self.ruleset.weights.tolist()
+
+    def score_factors(self, df: pd.DataFrame) -> pd.Series:
+        """Expand scored rows into their score_factors lists, largest contribution first.
+
+        Built from the score columns and the weights the rows were scored
+        with (see factor_weights), so calculate() need not store them.
+        """
+        weights = self.factor_weights(df)
+        contributions = factor_contributions(df, weights)
+        order = factor_order(contributions).tolist()
+        scores = [df[col].tolist() for _, col in FACTOR_FEATURES]
+        features = [feature for feature, _ in FACTOR_FEATURES]
+        contributions = contributions.tolist()
+        return pd.Series([
+            [{'feature': features[j], 'score': scores[j][i], 'weight': weights[j], 'contribution': contributions[i][j]}
+             for j in row_order]
+            for i, row_order in enumerate(order)
+        ], index=df.index, dtype=object)
+
     def _apply_decisions(self, df: pd.DataFrame) -> pd.DataFrame:
         decisions = self.rules.get('decisions', {})
         categories = decisions.get('risk_categories', [])
@@ -128,33 +313,29 @@ class FinanceScoreCalculator:
         def category_fn(score):
             if pd.isna(score):
                 return None
-            for rule in categories:
-                if rule['score'] == int(score):
-                    return rule['label']
-            return None
+            return match_category(int(score), categories)
 
         def flag_fn(row):
             score = row['final_finance_score']
-            sar = row.get('sar_score')
-            prem = row.get('premium_score')
             if pd.isna(score):
                 return 'Manual Review'
-            for rule in flags:
-                cond = rule.get('when', {})
-                ok = True
-                if 'final_score_in' in cond and int(score) not in cond['final_score_in']:
-                    ok = False
-                if ok and 'premium_score_in' in cond and prem not in cond['premium_score_in']:
-                    ok = False
-                if ok and 'sar_score_in' in cond and sar not in cond['sar_score_in']:
-                    ok = False
-                if ok:
-                    return rule.get('flag', 'Manual Review')
-            return 'Manual Review'
+            return match_flag(int(score), row.get('sar_score'), row.get('premium_score'), flags)
 
         logger.info("Applying decision rules for category and underwriting flag")
-        df['risk_category'] = df['final_finance_score'].apply(category_fn)
-        df['underwriting_flag'] = df.apply(flag_fn, axis=1)
+        if self.vectorized and self.decision_table is not None:
+            final = _column_values(df, 'final_finance_score')
+            sar = _column_values(df, 'sar_score') if 'sar_score' in df.columns else np.full(len(df), np.nan)
+            prem = _column_values(df, 'premium_score') if 'premium_score' in df.columns else np.full(len(df), np.nan)
+            category_values, flag_values, resolved = self.decision_table.lookup(final, sar, prem)
+            df['risk_category'] = pd.Series(category_values, index=df.index, dtype=object)
+            df['underwriting_flag'] = pd.Series(flag_values, index=df.index, dtype=object)
+            if not resolved.all():
+                rest = df.loc[~resolved]
+                df.loc[~resolved, 'risk_category'] = rest['final_finance_score'].apply(category_fn)
+                df.loc[~resolved, 'underwriting_flag'] = rest.apply(flag_fn, axis=1)
+        else:
+            df['risk_category'] = df['final_finance_score'].apply(category_fn)
+            df['underwriting_flag'] = df.apply(flag_fn, axis=1)
         return df
 
     def _validate_rows(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -165,8 +346,18 @@ class FinanceScoreCalculator:
                 if col not in row or pd.isna(row[col]) or row[col] is None:
                     issues.append(f"missing_{col}")
             return issues
-        df = df.copy()
-        df['validation_issues'] = df.apply(validate_row, axis=1)
+        if not self.projection:
+            df = df.copy()
+        if self.vectorized:
+            # Encode each row's missing columns as a bitmask and expand the few distinct patterns
+            codes = np.zeros(len(df), dtype=np.int64)
+            for bit, col in enumerate(required):
+                missing = df[col].isna().to_numpy() if col in df.columns else np.ones(len(df), dtype=bool)
+                codes |= missing.astype(np.int64) << bit
+            patterns = [[f"missing_{col}" for bit, col in enumerate(required) if code >> bit & 1] for code in range(1 << len(required))]
+            df['validation_issues'] = pd.Series([list(patterns[code]) for code in codes.tolist()], index=df.index, dtype=object)
+        else:
+            df['validation_issues'] = df.apply(validate_row, axis=1)
         return df
 
     def calculate(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -174,36 +365,115 @@ class FinanceScoreCalculator:
             logger.warning("No data provided to FinanceScoreCalculator.calculate")
             return df
         logger.info(f"Calculating Finance Scores for {len(df)} proposals")
-        df = self._compute_component_scores(df)
-        df = self._apply_decisions(df)
-        df = self._validate_rows(df)
+        self._refresh_rules()
+        if self.projection:
+            df = self._project(df)
+        if self.dedup:
+            df = self._calculate_deduplicated(df)
+        else:
+            df = self._score(df)
+        if self.projection:
+            for col in [col for col in df.columns if col not in OUTPUT_FIELDS]:
+                del df[col]
         logger.info("Finance Score calculation completed")
         return df
 
+    @staticmethod
+    def _project(df: pd.DataFrame) -> pd.DataFrame:
+        """The id and amount columns of ``df``: the only inputs the output schema depends on.
+
+        This is the single copy projection mode makes; every later stage adds
+        its columns to this frame in place.
+        """
+        return pd.DataFrame({col: df[col] for col in ID_COLUMNS + AMOUNT_COLUMNS if col in df.columns}, index=df.index)
+
+    def _stage(self, name: str, rows: int = 0):
+        return self.metrics.stage(name, rows) if self.metrics is not None else nullcontext({'rows': rows})
+
+    def _score(self, df: pd.DataFrame) -> pd.DataFrame:
+        with self._stage('compute_component_scores', len(df)):
+            df = self._compute_component_scores(df)
+        with self._stage('apply_decisions', len(df)):
+            df = self._apply_decisions(df)
+        with self._stage('validate_rows', len(df)):
+            return self._validate_rows(df)
+
+    def _calculate_deduplicated(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Score one row per distinct feature vector and broadcast the result to every proposal.
+
+        The extraction query repeats a proposer's income, premium and summed
+        sums assured on each of their proposals, so rows that differ only in
+        their ids score identically. The representatives carry the same set
+        of distinct values as the full frame, so output dtypes match a plain
+        run; rows of one group share their validation_issues lists (and
+        score_factors lists in eager explain mode).
+        """
+        features = [col for col in df.columns if col not in ID_COLUMNS]
+        if not features:
+            return self._score(df)
+        with self._stage('dedup_group', len(df)):
+            groups = df.groupby(features, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+            unique_groups, first = np.unique(groups, return_index=True)
+        logger.info(f"Dedup: {len(df)} proposals -> {len(unique_groups)} distinct feature vectors "
+                    f"(ratio {len(df) / len(unique_groups):.2f}x)")
+        representatives = df.iloc[first]
+        # Projection mode scores in place, so it needs a frame of its own rather than a slice
+        scored = self._score(representatives.copy() if self.projection else representatives)
+        # ngroup numbers groups by first appearance, so group g is scored row g
+        out = scored.iloc[groups].set_axis(df.index)
+        for col in ID_COLUMNS:
+            if col in df.columns:
+                out[col] = df[col]
+        return out
+
+    @property
+    def packed_store(self) -> Optional[PackedArtifactStore]:
+        """This run's packed segments in the output folder, or None for the per-file layout."""
+        if self.artifact_store != 'packed':
+            return None
+        if self._packed_store is None:
+            self._packed_store = PackedArtifactStore(self.output_dir)
+        return self._packed_store
+
+    def iter_records(self, df: pd.DataFrame, id_col: str = 'proposal_number'):
+        """Yield ``(id, record)`` per scored row, with score_factors expanded unless explain is off."""
+        factors = None
+        if 'score_factors' not in df.columns and self.explain != 'off':
+            factors = self.score_factors(df).tolist()
+        for i, (_, row) in enumerate(df.iterrows()):
+            record = {field: row.get(field) for field in OUTPUT_FIELDS}
+            if factors is not None:
+                record['score_factors'] = factors[i]
+            yield row[id_col], record
+
     def export_per_proposal(self, df: pd.DataFrame, id_col: str = 'proposal_number') -> None:
         if df is None or df.empty:
             logger.info("No rows to export")
             return
+        os.makedirs(self.output_dir, exist_ok=True)
+        store = self.packed_store
         count = 0
-        for _, row in df.iterrows():
-            pid = row[id_col]
-            record = {
-                'proposal_number': row.get('proposal_number'),
-                'proposer_id': row.get('proposer_id'),
-                'sar_income_ratio': row.get('sar_income_ratio'),
-                'tsar_income_ratio': row.get('tsar_income_ratio'),
-                'premium_income_ratio': row.get('premium_income_ratio'),
-                'sar_score': row.get('sar_score'),
-                'tsar_score': row.get('tsar_score'),
-                'premium_score': row.get('premium_score'),
-                'final_finance_score': row.get('final_finance_score'),
-                'risk_category': row.get('risk_category'),
-                'underwriting_flag': row.get('underwriting_flag'),
-                'score_factors': row.get('score_factors'),
-                'validation_issues': row.get('validation_issues')
-            }
-            out_path = os.path.join(self.output_dir, f"finance_score_{pid}.json")
-            with open(out_path, 'w', encoding='utf-8') as fh:
-                json.dump(record, fh, indent=2, default=lambda o: None)
-            count += 1
-        logger.info(f"Exported {count} per-proposal JSON files to {self.output_dir}") 
\ No newline at end of file
+        with self._stage('export_scores', len(df)):
+            for pid, record in self.iter_records(df, id_col):
+                if store is not None:
+                    store.append('scores', pid, record, default=lambda o: None)
+                else:
+                    out_path = os.path.join(self.output_dir, f"finance_score_{pid}.json")
+                    with open(out_path, 'w', encoding='utf-8') as fh:
+                        json.dump(record, fh, indent=2, default=lambda o: None)
+                count += 1
+        if store is not None:
+            logger.info(f"Packed {count} per-proposal score records into {store.directory}")
+        else:
+            logger.info(f"Exported {count} per-proposal JSON files to {self.output_dir}")
+
+    def flush(self) -> None:
+        """Flush this run's packed segments without closing them; no-op for the per-file layout."""
+        if self._packed_store is not None:
+            self._packed_store.flush()
+
+    def close(self) -> None:
+        """Finish this run's packed segments (writes their indexes); no-op for the per-file layout."""
+        if self._packed_store is not None:
+            self._packed_store.close()
+            self._packed_store = None 
\ No newline at end of file
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Persistent Finance Score Worker
+
+Long-lived companion to calculate_single_score.py. It keeps the compiled
+finance rules warm (compiled once, reloaded when the YAML changes) and serves
+requests as JSON lines:
+
+    stdin:  {"id": 1, "finance_data": {...}}
+    stdout: {"id": 1, "result": {...}}   or   {"id": 1, "error": "..."}
+
+``result`` has the same shape as the calculate_single_score.py output. Logs go
+to stderr so stdout carries protocol lines only. The worker exits when stdin
+is closed.
+"""
+
+import os
+import sys
+import json
+import logging
+
+# Add the current directory to Python path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from finance_rules import load_ruleset, resolve_rules_path
+    from calculate_single_score import score_finance_data
+except ImportError as e:
+    print(f"Error importing finance score modules: {e}", file=sys.stderr)
+    sys.exit(1)
+
+# Configure logging (stderr; stdout is reserved for responses)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def handle_line(line, rules_path):
+    """Score one request line and return the response dict."""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get('id')
+        finance_data = request.get('finance_data')
+        if not isinstance(finance_data, dict):
+            raise ValueError("Request must contain a finance_data object")
+        return {"id": request_id, "result": score_finance_data(finance_data, load_ruleset(rules_path))}
+    except Exception as e:
+        logger.error(f"Finance score request {request_id} failed: {e}")
+        return {"id": request_id, "error": str(e)}
+
+
+def main():
+    """Serve JSON-lines scoring requests from stdin until EOF."""
+    rules_path = resolve_rules_path()
+    load_ruleset(rules_path)
+    logger.info(f"Finance score worker ready (rules: {rules_path})")
+    served = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        response = handle_line(line, rules_path)
+        sys.stdout.write(json.dumps(response, default=str) + '\n')
+        sys.stdout.flush()
+        served += 1
+    logger.info(f"Finance score worker exiting after {served} requests")
+
+
+if __name__ == '__main__':
+    main()
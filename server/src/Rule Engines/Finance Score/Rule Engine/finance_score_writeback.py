@@ -0,0 +1,149 @@
+"""Bulk write-back of finance scores to the risk_assessments table.
+
+Stores pipeline scores where the Node finance routes read them
+(``risk_assessments.financial_score`` / ``outcome``), with the same mapping
+as the per-proposal route: the proposer's latest underwriting request is
+upserted on ``request_id`` and the underwriting flag becomes the outcome
+(Pass -> approved, Decline -> reject, anything else -> pending).
+
+Each chunk of scored rows is one transaction: the rows are COPYed into a
+temporary staging table and merged with a single INSERT ... ON CONFLICT.
+A proposer's proposals share one risk assessment, which always holds the
+highest proposal number written so far: the merge never replaces it with a
+lower one, so the result does not depend on how rows are split into chunks
+or parallel shards, nor on the order those commit in.
+"""
+
+import io
+import os
+import time
+import logging
+from typing import Dict
+
+import pandas as pd
+
+try:
+    from data_extraction import FinanceScoreDataExtractor
+except ImportError:
+    from .data_extraction import FinanceScoreDataExtractor
+
+logger = logging.getLogger(__name__)
+
+# Columns of a scored frame the write-back needs (workers ship only these to the parent)
+WRITEBACK_COLUMNS = ['proposal_number', 'proposer_id', 'final_finance_score', 'underwriting_flag']
+OUTCOMES = {'Pass': 'approved', 'Decline': 'reject'}
+DEFAULT_OUTCOME = 'pending'
+STAGE_TABLE = 'finance_score_stage'
+
+
+class FinanceScoreWriteBack:
+    """Upserts scored rows into risk_assessments, one COPY + merge transaction per chunk.
+
+    Connections come from ``extractor``'s pool; without one (snapshot replay)
+    a FinanceScoreDataExtractor is created from the DB_* env vars and closed
+    again by :meth:`close`. Env: TBL_RISK_ASSESSMENTS, TBL_UNDERWRITING_REQUESTS,
+    FIN_WRITEBACK_BATCH (rows per transaction, default 50000).
+    """
+
+    def __init__(self, extractor: FinanceScoreDataExtractor = None, batch_size: int = None):
+        self._owns_extractor = extractor is None
+        self.extractor = extractor or FinanceScoreDataExtractor()
+        self.batch_size = batch_size or int(os.environ.get('FIN_WRITEBACK_BATCH', '50000'))
+        self.tbl_risk_assessments = self.extractor._qual(os.environ.get('TBL_RISK_ASSESSMENTS', 'risk_assessments'))
+        self.tbl_underwriting_requests = self.extractor._qual(os.environ.get('TBL_UNDERWRITING_REQUESTS', 'underwriting_requests'))
+        self.stats: Dict[str, float] = {'rows': 0, 'upserted': 0, 'chunks': 0, 'seconds': 0.0}
+
+    def _stage_sql(self) -> str:
+        # Staging columns take the target tables' types, so COPY casts exactly as the merge expects
+        return f"""
+            CREATE TEMP TABLE {STAGE_TABLE} ON COMMIT DROP AS
+            SELECT ra.proposal_number, ur.proposer_id, ra.financial_score, ra.outcome
+            FROM {self.tbl_risk_assessments} ra CROSS JOIN {self.tbl_underwriting_requests} ur
+            WITH NO DATA
+        """
+
+    def _merge_sql(self) -> str:
+        # One row per request: a proposer's proposals share their latest request, the highest proposal number wins,
+        # within the chunk (DISTINCT ON) and against rows earlier chunks or shards already wrote (the WHERE guard)
+        return f"""
+            INSERT INTO {self.tbl_risk_assessments} AS ra (request_id, proposal_number, financial_score, outcome, created_at, updated_at)
+            SELECT DISTINCT ON (ur.request_id) ur.request_id, s.proposal_number, s.financial_score, s.outcome, NOW(), NOW()
+            FROM {STAGE_TABLE} s
+            CROSS JOIN LATERAL (
+                SELECT u.request_id FROM {self.tbl_underwriting_requests} u
+                WHERE u.proposer_id = s.proposer_id
+                ORDER BY u.created_at DESC
+                LIMIT 1
+            ) ur
+            ORDER BY ur.request_id, s.proposal_number DESC
+            ON CONFLICT (request_id)
+            DO UPDATE SET
+                proposal_number = EXCLUDED.proposal_number,
+                financial_score = EXCLUDED.financial_score,
+                outcome = EXCLUDED.outcome,
+                updated_at = EXCLUDED.updated_at
+            WHERE ra.proposal_number IS NULL OR EXCLUDED.proposal_number >= ra.proposal_number
+        """
+
+    @staticmethod
+    def _to_csv(chunk: pd.DataFrame) -> io.StringIO:
+        rows = pd.DataFrame({
+            'proposal_number': chunk['proposal_number'],
+            'proposer_id': chunk['proposer_id'],
+            'financial_score': pd.to_numeric(chunk['final_finance_score'], errors='coerce').astype('Int64'),
+            'outcome': chunk['underwriting_flag'].map(OUTCOMES).fillna(DEFAULT_OUTCOME),
+        })
+        buf = io.StringIO()
+        # Unquoted empty fields are NULL in COPY csv
+        rows.to_csv(buf, index=False, header=False, na_rep='')
+        buf.seek(0)
+        return buf
+
+    def _write_chunk(self, conn, chunk: pd.DataFrame) -> int:
+        buf = self._to_csv(chunk)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(self._stage_sql())
+                cur.copy_expert(
+                    f"COPY {STAGE_TABLE} (proposal_number, proposer_id, financial_score, outcome) FROM STDIN WITH (FORMAT csv)",
+                    buf,
+                )
+                cur.execute(self._merge_sql())
+                upserted = cur.rowcount
+            conn.commit()
+            return upserted
+        except Exception:
+            conn.rollback()
+            raise
+
+    def write(self, finance_df: pd.DataFrame) -> int:
+        """Upsert the scores of ``finance_df``; returns the number of risk assessments written."""
+        if finance_df is None or finance_df.empty:
+            return 0
+        started = time.perf_counter()
+        conn, conn_type = self.extractor.get_connection()
+        try:
+            if conn_type != 'psycopg2':
+                raise RuntimeError("Score write-back needs psycopg2 (COPY into a staging table)")
+            upserted = 0
+            for start in range(0, len(finance_df), self.batch_size):
+                upserted += self._write_chunk(conn, finance_df.iloc[start:start + self.batch_size])
+                self.stats['chunks'] += 1
+        finally:
+            self.extractor.release_connection(conn, conn_type)
+        elapsed = time.perf_counter() - started
+        self.stats['rows'] += len(finance_df)
+        self.stats['upserted'] += upserted
+        self.stats['seconds'] += elapsed
+        logger.info(f"Wrote back {len(finance_df)} scored rows as {upserted} risk assessments in {elapsed:.2f}s")
+        return upserted
+
+    def close(self) -> None:
+        """Log the run's write-back totals and close the extractor if this writer created it."""
+        stats = self.stats
+        if stats['chunks']:
+            rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+            logger.info(f"Score write-back: {stats['rows']} rows, {stats['upserted']} risk assessments upserted "
+                        f"in {stats['chunks']} transactions, {stats['seconds']:.2f}s ({rate:.0f} rows/s)")
+        if self._owns_extractor:
+            self.extractor.close()
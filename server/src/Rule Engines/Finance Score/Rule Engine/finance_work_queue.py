@@ -0,0 +1,351 @@
+"""Distributed finance scoring through a PostgreSQL work queue.
+
+A coordinator splits the eligible proposals (the gating of
+build_finance_score_query) into batches of proposal numbers in a work table;
+any number of worker processes, on any number of hosts sharing the database,
+claim batches with ``SELECT ... FOR UPDATE SKIP LOCKED``, extract and score
+them with FinanceScoreCalculator, write the artifacts (and, with
+FIN_WRITEBACK=true, the risk_assessments rows) and mark the batch done.
+
+A claim is a lease, renewed by a heartbeat thread every third of
+FIN_QUEUE_LEASE seconds while the batch is processed. A worker that crashes,
+or stalls so that its heartbeat stops, loses its batch to the next worker
+that polls, up to FIN_QUEUE_MAX_ATTEMPTS claims per batch, after which the
+batch is marked failed. A worker that finds its lease lost leaves the batch
+to its new holder without writing back or completing it. Re-scoring a batch
+is idempotent (artifacts are overwritten and the write-back upserts).
+Each worker appends to one packed segment per kind for its whole run
+(FIN_ARTIFACT_STORE=packed), flushed after every batch.
+
+Usage (DB_* env vars as for the pipeline):
+    python finance_work_queue.py enqueue [--batch-size 5000] [--run-id month-end]
+    python finance_work_queue.py work [--run-id month-end] [--processes 4]
+    python finance_work_queue.py status [--run-id month-end]
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+try:
+    from data_extraction import FinanceScoreDataExtractor
+    from finance_score_engine import FinanceScoreCalculator
+    from finance_score_writeback import FinanceScoreWriteBack
+except ImportError:
+    from .data_extraction import FinanceScoreDataExtractor
+    from .finance_score_engine import FinanceScoreCalculator
+    from .finance_score_writeback import FinanceScoreWriteBack
+
+
+class FinanceWorkQueue:
+    """Batches of proposal numbers in a work table, claimed under a lease.
+
+    Connections come from ``extractor``'s pool and are held only for the
+    duration of each queue statement. Env: TBL_FINANCE_WORK_QUEUE (default
+    finance_score_batches), FIN_QUEUE_LEASE (seconds, default 600),
+    FIN_QUEUE_MAX_ATTEMPTS (default 3).
+    """
+
+    def __init__(self, extractor: FinanceScoreDataExtractor):
+        self.extractor = extractor
+        self.table = extractor._qual(os.environ.get('TBL_FINANCE_WORK_QUEUE', 'finance_score_batches'))
+        self.lease_seconds = float(os.environ.get('FIN_QUEUE_LEASE', '600'))
+        self.max_attempts = int(os.environ.get('FIN_QUEUE_MAX_ATTEMPTS', '3'))
+
+    def _execute(self, sql: str, params=None, fetch: bool = False):
+        """Run one statement in its own transaction; returns (rows or None, rowcount)."""
+        conn, conn_type = self.extractor.get_connection()
+        try:
+            if conn_type != 'psycopg2':
+                raise RuntimeError("The finance work queue needs psycopg2")
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    rows = cur.fetchall() if fetch else None
+                    rowcount = cur.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return rows, rowcount
+        finally:
+            self.extractor.release_connection(conn, conn_type)
+
+    def _proposal_number_type(self) -> str:
+        """SQL type of the proposal table's proposal number, so batches bind to it without casts."""
+        column = self.extractor._first_existing_col(self.extractor.tbl_proposal, ['proposal_number', 'proposal_no']) or 'proposal_number'
+        rows, _ = self._execute(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s",
+            [self.extractor._qual(self.extractor.tbl_proposal), column], fetch=True,
+        )
+        return rows[0][0] if rows else 'bigint'
+
+    def create(self) -> None:
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                batch_id bigserial PRIMARY KEY,
+                run_id text NOT NULL,
+                proposal_numbers {self._proposal_number_type()}[] NOT NULL,
+                status text NOT NULL DEFAULT 'pending',
+                attempts int NOT NULL DEFAULT 0,
+                claimed_by text,
+                lease_expires_at timestamptz,
+                finished_at timestamptz,
+                error text
+            );
+            CREATE INDEX IF NOT EXISTS finance_score_batches_claim_idx ON {self.table} (status, run_id, batch_id);
+        """)
+
+    def enqueue(self, run_id: str, batch_size: int) -> int:
+        """Split the currently eligible proposals into batches of ``batch_size``; returns the batch count.
+
+        Runs entirely in the database: the gated proposal numbers never pass
+        through this process.
+        """
+        conn, conn_type = self.extractor.get_connection()
+        try:
+            query = self.extractor.build_finance_score_query(conn).strip().rstrip(';')
+        finally:
+            self.extractor.release_connection(conn, conn_type)
+        self.create()
+        _, batches = self._execute(f"""
+            INSERT INTO {self.table} (run_id, proposal_numbers)
+            SELECT %(run_id)s, array_agg(proposal_number ORDER BY proposal_number)
+            FROM (
+                SELECT proposal_number, (row_number() OVER (ORDER BY proposal_number) - 1) / %(batch_size)s AS batch_no
+                FROM (SELECT DISTINCT proposal_number FROM ({query}) eligible) proposals
+            ) numbered
+            GROUP BY batch_no
+            ORDER BY batch_no
+        """, {'run_id': run_id, 'batch_size': batch_size})
+        logger.info(f"Enqueued {batches} batches of up to {batch_size} proposals for run {run_id}")
+        return batches
+
+    def claim(self, worker_id: str, run_id: Optional[str] = None) -> Optional[Tuple[int, str, List]]:
+        """Lease the oldest claimable batch (pending, or claimed with an expired lease).
+
+        Returns (batch_id, run_id, proposal_numbers) or None. Concurrent
+        claimers skip each other's locked rows instead of waiting on them.
+        """
+        rows, _ = self._execute(f"""
+            UPDATE {self.table} q
+            SET status = 'claimed', claimed_by = %(worker)s, attempts = q.attempts + 1,
+                lease_expires_at = now() + make_interval(secs => %(lease)s)
+            WHERE q.batch_id = (
+                SELECT batch_id FROM {self.table}
+                WHERE (status = 'pending' OR (status = 'claimed' AND lease_expires_at < now()))
+                  AND attempts < %(max_attempts)s
+                  AND (%(run_id)s::text IS NULL OR run_id = %(run_id)s)
+                ORDER BY batch_id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING q.batch_id, q.run_id, q.proposal_numbers, q.attempts
+        """, {'worker': worker_id, 'lease': self.lease_seconds, 'max_attempts': self.max_attempts, 'run_id': run_id}, fetch=True)
+        if not rows:
+            return None
+        batch_id, batch_run, proposal_numbers, attempts = rows[0]
+        if attempts > 1:
+            logger.warning(f"Claimed batch {batch_id} on attempt {attempts} (an earlier attempt failed or its lease expired)")
+        return batch_id, batch_run, proposal_numbers
+
+    def complete(self, batch_id: int, worker_id: str) -> bool:
+        """Mark a batch done; False when the lease had already passed to another worker."""
+        _, updated = self._execute(f"""
+            UPDATE {self.table} SET status = 'done', finished_at = now(), lease_expires_at = NULL
+            WHERE batch_id = %s AND claimed_by = %s AND status = 'claimed'
+        """, [batch_id, worker_id])
+        if not updated:
+            logger.warning(f"Batch {batch_id} was reclaimed by another worker before {worker_id} finished it")
+        return bool(updated)
+
+    def renew(self, batch_id: int, worker_id: str) -> bool:
+        """Extend the lease of a batch this worker holds; False when it has passed to another worker."""
+        _, updated = self._execute(f"""
+            UPDATE {self.table} SET lease_expires_at = now() + make_interval(secs => %s)
+            WHERE batch_id = %s AND claimed_by = %s AND status = 'claimed'
+        """, [self.lease_seconds, batch_id, worker_id])
+        return bool(updated)
+
+    def fail(self, batch_id: int, worker_id: str, error: str) -> None:
+        """Release a batch after an error: back to pending, or failed once its attempts are used up."""
+        self._execute(f"""
+            UPDATE {self.table}
+            SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                lease_expires_at = NULL, error = %s
+            WHERE batch_id = %s AND claimed_by = %s AND status = 'claimed'
+        """, [self.max_attempts, error[:2000], batch_id, worker_id])
+
+    def fail_exhausted(self) -> int:
+        """Mark batches failed whose lease expired on their last allowed attempt; returns how many."""
+        _, failed = self._execute(f"""
+            UPDATE {self.table}
+            SET status = 'failed', lease_expires_at = NULL,
+                error = COALESCE(error, 'lease expired on attempt ' || attempts)
+            WHERE status = 'claimed' AND lease_expires_at < now() AND attempts >= %s
+        """, [self.max_attempts])
+        if failed:
+            logger.error(f"{failed} batches failed: lease expired on their last attempt")
+        return failed
+
+    def status(self, run_id: Optional[str] = None) -> Dict[str, int]:
+        """Batch counts per status; expired leases are counted as 'expired'."""
+        rows, _ = self._execute(f"""
+            SELECT CASE WHEN status = 'claimed' AND lease_expires_at < now() THEN 'expired' ELSE status END, count(*)
+            FROM {self.table}
+            WHERE %(run_id)s::text IS NULL OR run_id = %(run_id)s
+            GROUP BY 1
+        """, {'run_id': run_id}, fetch=True)
+        return {state: count for state, count in rows}
+
+
+class LeaseHeartbeat:
+    """Renews a claimed batch's lease from a background thread while the batch is processed.
+
+    Renews every third of the lease. ``lost`` is set once a renewal finds the
+    batch no longer claimed by this worker; failed renewals (database errors)
+    are logged and retried at the next beat.
+    """
+
+    def __init__(self, queue: FinanceWorkQueue, batch_id: int, worker_id: str, interval: Optional[float] = None):
+        self.queue = queue
+        self.batch_id = batch_id
+        self.worker_id = worker_id
+        self.interval = interval or queue.lease_seconds / 3
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{batch_id}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                renewed = self.queue.renew(self.batch_id, self.worker_id)
+            except Exception:
+                logger.warning(f"Could not renew the lease of batch {self.batch_id}", exc_info=True)
+                continue
+            if not renewed:
+                self.lost = True
+                logger.warning(f"Lease of batch {self.batch_id} passed to another worker while {self.worker_id} was scoring it")
+                return
+
+    def __enter__(self) -> 'LeaseHeartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(run_id: Optional[str] = None, poll_seconds: float = 2.0) -> Dict[str, int]:
+    """Claim, score and complete batches until the queue (or ``run_id``) has no open batches.
+
+    Waits while other workers still hold leases, so batches of a crashed
+    worker are picked up once their lease expires. Returns the worker's
+    counters; ``lost`` counts batches whose lease passed to another worker.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    extractor = FinanceScoreDataExtractor()
+    queue = FinanceWorkQueue(extractor)
+    # Rows are scored in arbitrary batches; keep each row's output independent of its batch
+    calculator = FinanceScoreCalculator(batch_invariant=True)
+    writeback = FinanceScoreWriteBack(extractor) if os.environ.get('FIN_WRITEBACK', 'false').lower() == 'true' else None
+    stats = Counter()
+    try:
+        while True:
+            claim = queue.claim(worker_id, run_id)
+            if claim is None:
+                queue.fail_exhausted()
+                open_batches = {k: v for k, v in queue.status(run_id).items() if k in ('pending', 'claimed', 'expired')}
+                if not open_batches:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            batch_id, _, proposal_numbers = claim
+            started = time.perf_counter()
+            try:
+                with LeaseHeartbeat(queue, batch_id, worker_id) as heartbeat:
+                    data_df = extractor.extract_proposals(proposal_numbers)
+                    extractor.export_per_proposal_inputs(data_df, calculator.output_dir, id_col='proposal_number', store=calculator.packed_store)
+                    finance_df = calculator.calculate(data_df)
+                    calculator.export_per_proposal(finance_df, id_col='proposal_number')
+                    # Packed records reach disk before the batch counts as done
+                    calculator.flush()
+                    if writeback is not None and not heartbeat.lost:
+                        writeback.write(finance_df)
+            except Exception as e:
+                logger.error(f"Batch {batch_id} failed", exc_info=True)
+                queue.fail(batch_id, worker_id, f"{type(e).__name__}: {e}")
+                stats['failed'] += 1
+                continue
+            if heartbeat.lost or not queue.complete(batch_id, worker_id):
+                logger.warning(f"Batch {batch_id}: lease lost after {time.perf_counter() - started:.2f}s; "
+                               f"left to the worker now holding it")
+                stats['lost'] += 1
+                continue
+            stats['batches'] += 1
+            stats['rows'] += len(data_df)
+            logger.info(f"Batch {batch_id}: scored {len(data_df)} rows in {time.perf_counter() - started:.2f}s")
+    finally:
+        calculator.close()
+        if writeback is not None:
+            writeback.close()
+        extractor.close()
+    logger.info(f"Worker {worker_id} finished: {dict(stats)}")
+    return dict(stats)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Distributed finance scoring through a PostgreSQL work queue")
+    sub = parser.add_subparsers(dest='command', required=True)
+    enqueue = sub.add_parser('enqueue', help="queue the eligible proposals in batches")
+    enqueue.add_argument('--batch-size', type=int, default=5000)
+    enqueue.add_argument('--run-id', default=None, help="label of this run (default: current timestamp)")
+    work = sub.add_parser('work', help="claim and score batches until none are open")
+    work.add_argument('--run-id', default=None, help="only claim batches of this run")
+    work.add_argument('--processes', type=int, default=1, help="local worker processes to start")
+    work.add_argument('--poll', type=float, default=2.0, help="seconds between polls while other leases are open")
+    status = sub.add_parser('status', help="print batch counts per status")
+    status.add_argument('--run-id', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'work':
+        if args.processes <= 1:
+            stats = run_worker(args.run_id, args.poll)
+            return 0 if not stats.get('failed') else 1
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            results = list(pool.map(run_worker, [args.run_id] * args.processes, [args.poll] * args.processes))
+        totals = sum((Counter(r) for r in results), Counter())
+        logger.info(f"{args.processes} local workers finished: {dict(totals)}")
+        return 0 if not totals.get('failed') else 1
+
+    extractor = FinanceScoreDataExtractor()
+    try:
+        queue = FinanceWorkQueue(extractor)
+        if args.command == 'enqueue':
+            run_id = args.run_id or datetime.now().strftime('%Y%m%d%H%M%S')
+            queue.enqueue(run_id, args.batch_size)
+            print(run_id)
+        else:
+            print(queue.status(args.run_id))
+    finally:
+        extractor.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,43 +3,303 @@
 This script coordinates extraction (gated by validated+finreview) and scoring
 using the YAML-configured rule engine, and writes per-proposal inputs and
 scored outputs to a structured dated folder under this directory.
+
+Artifact format: every row is scored batch-invariantly, so a proposal's
+finance_score_<n>.json is the same for any worker count, chunk size or
+population, and matches what scoring that proposal on its own (e.g.
+calculate_single_score.py) writes. Before, the pipeline serialized each
+field with the dtype of the whole batch. Consumers of the per-proposal
+JSON will see:
+- missing ratios and scores written as null, never NaN (NaN is not valid
+  JSON);
+- band scores keeping the rules file's type (5, not 5.0, for integer bands);
+- a missing score's score_factors entry with contribution 0.0 instead of
+  NaN, ordered as a factor that contributes nothing.
+
+The environment variables that tune a run (chunking, incremental scoring,
+worker processes, write-back, metrics, ...) are listed in ENVIRONMENT_HELP,
+shown by ``python run_finance_pipeline.py --help``.
+For runs larger than one host, finance_work_queue.py distributes the same
+scoring across worker processes on any number of hosts through a PostgreSQL
+work queue.
+External Parquet/CSV books that never enter the database are scored out of
+core into partitioned Parquet by score_finance_dataset.py.
+
+Pass --input snapshot.parquet (or an Arrow IPC/Feather file) to replay a
+snapshot written by FinanceScoreDataExtractor.export_data instead of querying
+the database; it is read memory-mapped in record batches of FIN_CHUNK_SIZE
+rows (default 65536) and produces the normal artifacts.
 """
 
 import sys
+import time
+import argparse
 import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 import os
+import pandas as pd
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
 logger = logging.getLogger(__name__)
 
 try:
-    from data_extraction import FinanceScoreDataExtractor
+    from data_extraction import FinanceScoreDataExtractor, export_per_proposal_inputs
     from finance_score_engine import FinanceScoreCalculator
+    from finance_input_index import FinanceInputIndex
+    from finance_snapshot import FinanceSnapshotSource
+    from finance_score_writeback import FinanceScoreWriteBack, WRITEBACK_COLUMNS
+    from finance_run_metrics import RunMetrics
 except ImportError:
-    from .data_extraction import FinanceScoreDataExtractor
+    from .data_extraction import FinanceScoreDataExtractor, export_per_proposal_inputs
     from .finance_score_engine import FinanceScoreCalculator
+    from .finance_input_index import FinanceInputIndex
+    from .finance_snapshot import FinanceSnapshotSource
+    from .finance_score_writeback import FinanceScoreWriteBack, WRITEBACK_COLUMNS
+    from .finance_run_metrics import RunMetrics
+
+def score_shard(shard, rules_path: str, output_dir: str, return_scores: bool = False) -> dict:
+    """Score and export one shard in a worker process; returns the shard's stats.
+
+    With ``return_scores`` the stats also carry the WRITEBACK_COLUMNS of the
+    scored rows, for the parent's database write-back. ``stages`` holds the
+    shard's RunMetrics stages for the parent's run manifest.
+    """
+    started = time.perf_counter()
+    metrics = RunMetrics()
+    calculator = FinanceScoreCalculator(rules_path=rules_path, batch_invariant=True, metrics=metrics)
+    # Dated folder chosen by the parent so every shard lands in the same place
+    calculator.output_dir = output_dir
+    with metrics.stage('export_inputs', len(shard)):
+        export_per_proposal_inputs(shard, output_dir, id_col='proposal_number', store=calculator.packed_store)
+    finance_df = calculator.calculate(shard)
+    calculator.export_per_proposal(finance_df, id_col='proposal_number')
+    # Each worker packs into its own segments; index them before the parent commits
+    calculator.close()
+    return {
+        'rows': len(shard),
+        'scored': int(finance_df['final_finance_score'].notna().sum()),
+        'flags': dict(Counter(finance_df['underwriting_flag'])),
+        'seconds': time.perf_counter() - started,
+        'scores': finance_df[WRITEBACK_COLUMNS] if return_scores else None,
+        'stages': metrics.stages,
+    }
+
+def run_parallel(data_df, calculator, workers: int, writeback=None, metrics=None) -> dict:
+    """Shard ``data_df`` by proposal number and score/export the shards in a process pool.
+
+    All rows of a proposal land in the same shard and keep their relative order,
+    and each row is scored batch-invariantly, so the artifacts do not depend on
+    the worker count. Each shard is written back as it finishes; the merge keeps
+    a proposer's highest proposal (see finance_score_writeback), so
+    risk_assessments does not depend on the shard completion order either.
+    Returns the merged per-shard stats; the shards' stages are merged into
+    ``metrics``.
+    """
+    metrics = metrics or RunMetrics()
+    keys = data_df['proposal_number'].astype(str).to_numpy()
+    shard_ids = pd.util.hash_array(keys) % workers
+    shards = [data_df[shard_ids == i] for i in range(workers)]
+    logger.info(f"Scoring {len(data_df)} proposals in {workers} shards: {[len(s) for s in shards]}")
+
+    merged = {'rows': 0, 'scored': 0, 'flags': Counter()}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(score_shard, shard, calculator.rules_path, calculator.output_dir, writeback is not None)
+                   for shard in shards if not shard.empty]
+        for number, future in enumerate(futures, start=1):
+            stats = future.result()
+            metrics.merge(stats['stages'])
+            if writeback is not None:
+                with metrics.stage('writeback', len(stats['scores'])):
+                    writeback.write(stats['scores'])
+            merged['rows'] += stats['rows']
+            merged['scored'] += stats['scored']
+            merged['flags'].update(stats['flags'])
+            logger.info(f"Shard {number}: {stats['rows']} proposals in {stats['seconds']:.2f}s")
+    logger.info(f"Scored {merged['scored']} of {merged['rows']} proposals; flags: {dict(merged['flags'])}")
+    return merged
+
+def run_chunked(extractor, calculator, chunk_size: int, input_index=None, writeback=None, metrics=None) -> int:
+    """Stream extraction, scoring and export chunk by chunk.
+
+    Chunks of at most ``chunk_size`` rows are extracted, scored and exported
+    one at a time, so only one chunk (plus its scored copy) is held in memory
+    and artifacts are written as soon as each chunk is scored. With an
+    ``input_index`` only new or changed proposals of each chunk are scored;
+    with a ``writeback`` each chunk's scores are upserted to the database in
+    its own transaction. Stage times of every chunk add up in ``metrics``.
+
+    The DOB checks of the in-memory path hold before anything is written: a
+    missing ``dob`` column aborts on the first chunk, and chunks are held back
+    unscored until one with a non-null DOB arrives, so an all-null DOB
+    population aborts with no artifacts or database rows written. (A leading
+    run of all-null DOB chunks is therefore buffered in memory.)
+    """
+    metrics = metrics or RunMetrics()
+
+    def score_and_export(chunk):
+        if input_index is None:
+            selected = chunk
+        else:
+            with metrics.stage('select_changed', len(chunk)):
+                selected = input_index.select_changed(chunk)
+        finance_df = calculator.calculate(selected) if not selected.empty else selected
+        with metrics.stage('export_inputs', len(selected)):
+            extractor.export_per_proposal_inputs(selected, calculator.output_dir, id_col='proposal_number', store=calculator.packed_store)
+        calculator.export_per_proposal(finance_df, id_col='proposal_number')
+        if writeback is not None:
+            with metrics.stage('writeback', len(finance_df)):
+                writeback.write(finance_df)
+        return len(selected)
+
+    total = 0
+    exported = 0
+    dob_null_count = 0
+    held = []
+    for number, chunk in enumerate(metrics.iterate('extract', extractor.iter_extract(chunk_size)), start=1):
+        if 'dob' not in chunk.columns:
+            logger.error("DOB column is missing from extracted data. Running schema debug...")
+            extractor.debug_schema()
+            return 1
+        dob_null_count += int(chunk['dob'].isnull().sum())
+        total += len(chunk)
+        held.append((number, chunk))
+        if dob_null_count == total:
+            # Only null DOBs so far: wait for a chunk that shows the population is usable
+            continue
+        for held_number, held_chunk in held:
+            scored = score_and_export(held_chunk)
+            exported += len(held_chunk)
+            logger.info(f"Chunk {held_number}: scored and exported {scored} of {len(held_chunk)} proposals ({exported} so far)")
+        held = []
+
+    if total == 0:
+        logger.warning("No eligible proposals found (validated+finreview). Exiting.")
+        return 1
+    if dob_null_count == total:
+        logger.error("All DOB values are null. Running schema debug...")
+        extractor.debug_schema()
+        return 1
+    elif dob_null_count > 0:
+        logger.warning(f"Found {dob_null_count} null DOB values out of {total} records")
+
+    calculator.close()
+    if input_index is not None:
+        input_index.commit()
+    logger.info(f"Finance Score pipeline completed successfully ({total} proposals). Artifacts: {calculator.output_dir}")
+    return 0
+
+# Record batch size for snapshot replay when FIN_CHUNK_SIZE is not set
+REPLAY_BATCH_SIZE = 65536
 
-def main():
+# The one place the pipeline's environment flags are documented (--help epilog)
+ENVIRONMENT_HELP = """\
+environment:
+  FIN_RULES_YAML        rules file (default: finance_score_rules.yaml here)
+  FIN_OUTPUT_DIR        artifact root; each run writes to a dated folder below it
+                        (default: finance_scores here)
+  FIN_CHUNK_SIZE        positive row count: stream extract -> score -> export in
+                        chunks, keeping memory flat for large books
+  FIN_INCREMENTAL       true: score and export only proposals whose extracted inputs
+                        changed since the last run (see finance_input_index)
+  FIN_WORKERS           process count above 1: shard the extracted population by
+                        proposal number and score/export the shards in parallel
+                        (non-chunked runs); artifacts are the same for any count
+  FIN_DEDUP             true: score each distinct proposer feature vector once and
+                        broadcast it to all of that proposer's proposals
+  FIN_VECTORIZED        false: score with the row-wise fallback paths
+  FIN_PROJECTION        true: score only the id and amount columns without
+                        full-frame copies
+  FIN_EXPLAIN           lazy (default): expand score_factors only when records are
+                        exported; eager: add the column in calculate(); off: null
+  FIN_ARTIFACT_STORE    packed: append per-proposal records to one compressed
+                        JSON-lines segment per run (and worker) with an offset
+                        index instead of two JSON files per proposal
+  FIN_WRITEBACK         true: also upsert every scored row into risk_assessments
+                        (see finance_score_writeback)
+  FIN_WRITEBACK_BATCH   rows per write-back COPY + merge transaction (default 50000)
+  FIN_METRICS_TEXTFILE  also write the run manifest's per-stage timings as
+                        Prometheus gauges for node_exporter's textfile collector
+  DEBUG_SCHEMA          true: log the database schema before extracting
+  DB_*, FIN_EXTRACT_MODE, FIN_COMPACT_DTYPES, FIN_QUERY_PLAN, FIN_SCHEMA_CACHE*,
+  FIN_DB_POOL*          database connection and extraction settings, see
+                        FinanceScoreDataExtractor in data_extraction.py
+"""
+
+def main(argv=None):
     """Run the extraction→scoring pipeline and write per-proposal artifacts.
 
     Returns 0 on success, non-zero on early termination (no eligible proposals
     or no scores produced). Paths are resolved within this directory by default.
+    Per-stage timings are written to a run_manifest_*.json in the dated folder
+    (see finance_run_metrics), however the run ends.
     """
+    parser = argparse.ArgumentParser(description="Finance Score pipeline", epilog=ENVIRONMENT_HELP,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', help="replay a Parquet or Arrow IPC snapshot instead of querying the database")
+    args = parser.parse_args(argv)
+
     base_dir = os.path.dirname(os.path.abspath(__file__))
     rules_path = os.environ.get('FIN_RULES_YAML', os.path.join(base_dir, 'finance_score_rules.yaml'))
     output_dir = os.environ.get('FIN_OUTPUT_DIR', os.path.join(base_dir, 'finance_scores'))
 
+    chunk_size = int(os.environ.get('FIN_CHUNK_SIZE', '0') or 0)
+
     logger.info("Finance Score pipeline started")
-    extractor = FinanceScoreDataExtractor()
-    
+    if args.input:
+        extractor = FinanceSnapshotSource(args.input)
+        chunk_size = chunk_size or REPLAY_BATCH_SIZE
+    else:
+        extractor = FinanceScoreDataExtractor()
+    writeback = None
+    metrics = RunMetrics()
+    exit_code = 1
+    try:
+        if os.environ.get('FIN_WRITEBACK', 'false').lower() == 'true':
+            # Replayed snapshots have no database of their own; the writer then connects from DB_* env vars
+            writeback = FinanceScoreWriteBack(extractor if isinstance(extractor, FinanceScoreDataExtractor) else None)
+        exit_code = run_pipeline(extractor, rules_path, output_dir, chunk_size, writeback, metrics)
+        return exit_code
+    finally:
+        if writeback is not None:
+            writeback.close()
+        # Logs connection pool statistics and closes pooled connections
+        extractor.close()
+        # Runs that stop before scoring still get a manifest in today's folder
+        metrics.finish(exit_code, metrics.output_dir or os.path.join(output_dir, metrics.started_at.strftime('%Y%m%d')))
+
+def run_pipeline(extractor, rules_path: str, output_dir: str, chunk_size: int = 0, writeback=None, metrics=None) -> int:
+    """Pipeline body of main(); ``extractor`` connections are reused throughout.
+
+    ``extractor`` is a FinanceScoreDataExtractor or a FinanceSnapshotSource;
+    a positive ``chunk_size`` streams it chunk by chunk (see run_chunked).
+    With a FinanceScoreWriteBack the scores are also upserted to risk_assessments.
+    Stage timings go to ``metrics``, whose output_dir is set to the run's dated folder.
+    """
+    metrics = metrics or RunMetrics()
     # Debug schema if needed
     if os.environ.get('DEBUG_SCHEMA', 'false').lower() == 'true':
         logger.info("Running schema debug...")
         extractor.debug_schema()
-    
-    data_df = extractor.extract()
+
+    incremental = os.environ.get('FIN_INCREMENTAL', 'false').lower() == 'true'
+    workers = int(os.environ.get('FIN_WORKERS', '1') or 1)
+    # Every row is scored batch-invariantly, so artifacts are the same for any
+    # worker count or chunk size (score_shard does the same in the workers)
+    if chunk_size > 0:
+        calculator = FinanceScoreCalculator(rules_path=rules_path, output_dir=output_dir, batch_invariant=True, metrics=metrics)
+        metrics.output_dir = calculator.output_dir
+        input_index = FinanceInputIndex(calculator.output_root, calculator.ruleset.digest) if incremental else None
+        try:
+            return run_chunked(extractor, calculator, chunk_size, input_index, writeback, metrics)
+        finally:
+            calculator.close()
+
+    with metrics.stage('extract') as counter:
+        data_df = extractor.extract()
+        counter['rows'] = 0 if data_df is None else len(data_df)
 
     if data_df is None or data_df.empty:
         logger.warning("No eligible proposals found (validated+finreview). Exiting.")
@@ -59,16 +319,43 @@ def main():
     elif dob_null_count > 0:
         logger.warning(f"Found {dob_null_count} null DOB values out of {len(data_df)} records")
 
-    calculator = FinanceScoreCalculator(rules_path=rules_path, output_dir=output_dir)
+    calculator = FinanceScoreCalculator(rules_path=rules_path, output_dir=output_dir, batch_invariant=True, metrics=metrics)
+    metrics.output_dir = calculator.output_dir
+
+    input_index = None
+    if incremental:
+        input_index = FinanceInputIndex(calculator.output_root, calculator.ruleset.digest)
+        with metrics.stage('select_changed', len(data_df)):
+            data_df = input_index.select_changed(data_df)
+        if data_df.empty:
+            input_index.commit()
+            logger.info("No new or changed proposals since the last run; nothing to score")
+            return 0
+
+    if workers > 1:
+        with metrics.stage('score_shards', len(data_df)):
+            run_parallel(data_df, calculator, workers, writeback, metrics)
+        if input_index is not None:
+            input_index.commit()
+        logger.info(f"Finance Score pipeline completed successfully. Artifacts: {calculator.output_dir}")
+        return 0
 
-    extractor.export_per_proposal_inputs(data_df, calculator.output_dir, id_col='proposal_number')
+    with metrics.stage('export_inputs', len(data_df)):
+        extractor.export_per_proposal_inputs(data_df, calculator.output_dir, id_col='proposal_number', store=calculator.packed_store)
 
     finance_df = calculator.calculate(data_df)
     if finance_df is None or finance_df.empty:
+        calculator.close()
         logger.warning("No finance scores were produced. Exiting.")
         return 1
 
     calculator.export_per_proposal(finance_df, id_col='proposal_number')
+    calculator.close()
+    if writeback is not None:
+        with metrics.stage('writeback', len(finance_df)):
+            writeback.write(finance_df)
+    if input_index is not None:
+        input_index.commit()
 
     logger.info(f"Finance Score pipeline completed successfully. Artifacts: {calculator.output_dir}")
     return 0
@@ -0,0 +1,281 @@
+"""Out-of-core Finance Score bulk scoring of Parquet / CSV datasets.
+
+Scores external books (broker bulk uploads, migrated portfolios) that never
+pass through the database. The input, a Parquet or CSV file or a directory
+of them, is scanned as a pyarrow dataset in record batches. Only the id and
+amount columns are read, and Arrow decodes them on its own thread pool. Each
+batch is scored by a pool of worker processes with FinanceScoreCalculator in
+projection mode. Each worker writes its batch straight to a Parquet part
+file with the export_per_proposal fields, hive-partitioned by underwriting
+flag by default:
+
+    <output>/underwriting_flag=Pass/part-000000-0.parquet
+    <output>/underwriting_flag=Decline/part-000000-0.parquet
+    ...
+
+At most two batches per worker are in flight at a time, so memory stays
+bounded by the batch size rather than the dataset size. Amounts are cleaned
+per batch as the engine cleans them: comma-formatted strings are parsed and
+unparsable or negative amounts score as missing. The output directory must
+be empty (or absent) unless --overwrite is given, so a rerun never mixes in
+part files from an earlier one.
+
+Usage:
+    python score_finance_dataset.py broker_upload/ scored/ [--format csv] [--workers 8]
+        [--batch-size 262144] [--partition-by underwriting_flag] [--rules finance_score_rules.yaml] [--no-explain]
+        [--overwrite]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+try:
+    from finance_score_engine import (AMOUNT_COLUMNS, FACTOR_FEATURES, ID_COLUMNS, OUTPUT_FIELDS, FinanceScoreCalculator,
+                                      amount_values, factor_contributions, factor_order)
+    from finance_rules import resolve_rules_path
+except ImportError:
+    from .finance_score_engine import (AMOUNT_COLUMNS, FACTOR_FEATURES, ID_COLUMNS, OUTPUT_FIELDS, FinanceScoreCalculator,
+                                       amount_values, factor_contributions, factor_order)
+    from .finance_rules import resolve_rules_path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+DATASET_FORMATS = ('parquet', 'csv')
+DEFAULT_BATCH_SIZE = 262144
+
+# Score and ratio types are fixed so every part file has the same schema,
+# even when a batch has no value at all for a column
+SCORE_FACTOR_TYPE = pa.struct([
+    ('feature', pa.string()), ('score', pa.float64()), ('weight', pa.float64()), ('contribution', pa.float64()),
+])
+SCORED_TYPES = {
+    'sar_income_ratio': pa.float64(),
+    'tsar_income_ratio': pa.float64(),
+    'premium_income_ratio': pa.float64(),
+    'sar_score': pa.float64(),
+    'tsar_score': pa.float64(),
+    'premium_score': pa.float64(),
+    'final_finance_score': pa.int64(),
+    'risk_category': pa.string(),
+    'underwriting_flag': pa.string(),
+    'score_factors': pa.list_(SCORE_FACTOR_TYPE),
+    'validation_issues': pa.list_(pa.string()),
+}
+
+
+def resolve_format(path: str, fmt: str = 'auto') -> str:
+    """The dataset format of ``path``: ``fmt``, or guessed from the (first) file's suffix."""
+    if fmt != 'auto':
+        return fmt
+    if os.path.isdir(path):
+        names = sorted(name for _, _, files in os.walk(path) for name in files)
+    else:
+        names = [path]
+    for name in names:
+        lowered = name.lower()
+        if lowered.endswith(('.parquet', '.pq')):
+            return 'parquet'
+        if lowered.endswith(('.csv', '.csv.gz')):
+            return 'csv'
+    raise ValueError(f"Cannot tell the format of {path}; pass --format {'/'.join(DATASET_FORMATS)}")
+
+
+def open_dataset(path: str, fmt: str) -> ds.Dataset:
+    """Open ``path`` as a pyarrow dataset.
+
+    CSV amounts are read as strings and parsed per batch (see clean_amounts):
+    a forced numeric type would fail the whole scan on one "5,00,000" or
+    "n/a", and inferred types could differ between files.
+    """
+    if fmt == 'csv':
+        import pyarrow.csv as pacsv
+        convert = pacsv.ConvertOptions(column_types={col: pa.string() for col in AMOUNT_COLUMNS})
+        return ds.dataset(path, format=ds.CsvFileFormat(convert_options=convert))
+    return ds.dataset(path, format='parquet')
+
+
+def clean_amounts(frame: pd.DataFrame) -> pd.DataFrame:
+    """Replace the amount columns of ``frame`` by float64 values, NaN where missing, unparsable or negative."""
+    for col in AMOUNT_COLUMNS:
+        if col in frame.columns:
+            frame[col] = amount_values(frame, col)
+    return frame
+
+
+def prepare_output_dir(output_dir: str, overwrite: bool = False) -> None:
+    """Create ``output_dir``; a non-empty one is cleared with ``overwrite`` and refused otherwise."""
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        if not overwrite:
+            raise ValueError(f"{output_dir} is not empty; pass --overwrite to replace its contents")
+        logger.info(f"Clearing {output_dir}")
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+
+def output_schema(input_schema: pa.Schema) -> pa.Schema:
+    """Schema of the scored part files: the ids keep their input types, then the output fields."""
+    fields = []
+    for name in OUTPUT_FIELDS:
+        if name in SCORED_TYPES:
+            fields.append(pa.field(name, SCORED_TYPES[name]))
+        else:
+            fields.append(input_schema.field(name))
+    return pa.schema(fields)
+
+
+def score_factors_array(calculator: FinanceScoreCalculator, finance_df: pd.DataFrame) -> pa.Array:
+    """The score_factors column built straight from the contribution matrix, without per-row dicts."""
+    n = len(finance_df)
+    if calculator.explain == 'off':
+        return pa.nulls(n, SCORED_TYPES['score_factors'])
+    weights = calculator.factor_weights(finance_df)
+    contributions = factor_contributions(finance_df, weights)
+    order = factor_order(contributions)
+    rows = np.arange(n)[:, None]
+    scores = np.column_stack([finance_df[col].to_numpy(dtype='float64', na_value=np.nan) for _, col in FACTOR_FEATURES])
+    features = np.array([feature for feature, _ in FACTOR_FEATURES], dtype=object)
+    factors = pa.StructArray.from_arrays([
+        pa.array(features[order].ravel(), type=pa.string()),
+        pa.array(scores[rows, order].ravel(), from_pandas=True),
+        pa.array(np.asarray(weights, dtype='float64')[order].ravel()),
+        pa.array(contributions[rows, order].ravel(), from_pandas=True),
+    ], fields=list(SCORE_FACTOR_TYPE))
+    offsets = pa.array(np.arange(0, len(FACTOR_FEATURES) * n + 1, len(FACTOR_FEATURES), dtype=np.int32))
+    return pa.ListArray.from_arrays(offsets, factors)
+
+
+def to_table(calculator: FinanceScoreCalculator, finance_df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Convert a calculate() result to an Arrow table of ``schema``."""
+    return pa.Table.from_arrays(
+        [score_factors_array(calculator, finance_df) if field.name == 'score_factors'
+         else pa.array(finance_df[field.name], type=field.type, from_pandas=True) for field in schema],
+        schema=schema,
+    )
+
+
+# Per-process state of the scoring workers (set up once by _init_worker)
+_calculator = None
+
+
+def _init_worker(rules_path: str, explain: str = None) -> None:
+    global _calculator
+    _calculator = FinanceScoreCalculator(rules_path=rules_path, projection=True, explain=explain)
+
+
+def score_batch(batch: pa.RecordBatch, part: int, schema: pa.Schema, output_dir: str, partition_by) -> dict:
+    """Score one record batch and write it as part ``part``; returns the batch's stats."""
+    started = time.perf_counter()
+    finance_df = _calculator.calculate(clean_amounts(batch.to_pandas()))
+    table = to_table(_calculator, finance_df, schema)
+    partitioning = ds.partitioning(pa.schema([schema.field(partition_by)]), flavor='hive') if partition_by else None
+    # output_dir starts empty (prepare_output_dir) and part numbers are unique, so nothing is overwritten;
+    # 'overwrite_or_ignore' only lets workers add parts to partitions the others already created
+    ds.write_dataset(
+        table, output_dir, format='parquet', partitioning=partitioning,
+        basename_template=f"part-{part:06d}-{{i}}.parquet", existing_data_behavior='overwrite_or_ignore',
+    )
+    return {
+        'rows': batch.num_rows,
+        'scored': int(finance_df['final_finance_score'].notna().sum()),
+        'flags': dict(Counter(finance_df['underwriting_flag'])),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def score_dataset(input_path: str, output_dir: str, fmt: str = 'auto', workers: int = None,
+                  batch_size: int = DEFAULT_BATCH_SIZE, partition_by: str = 'underwriting_flag',
+                  rules_path: str = None, explain: str = None, overwrite: bool = False) -> dict:
+    """Stream ``input_path`` through the scoring workers into a Parquet dataset under ``output_dir``.
+
+    ``output_dir`` must be empty or absent; with ``overwrite`` its contents are removed first.
+
+    Returns the merged stats: rows, scored rows, flag counts, parts and seconds.
+    """
+    started = time.perf_counter()
+    dataset = open_dataset(input_path, resolve_format(input_path, fmt))
+    missing = [col for col in ID_COLUMNS if col not in dataset.schema.names]
+    if missing:
+        raise ValueError(f"{input_path} has no {', '.join(missing)} column")
+    columns = [col for col in ID_COLUMNS + AMOUNT_COLUMNS if col in dataset.schema.names]
+    absent = sorted(set(AMOUNT_COLUMNS) - set(columns))
+    if absent:
+        logger.warning(f"{input_path} has no {', '.join(absent)} column; affected ratios will be missing")
+    schema = output_schema(dataset.schema)
+    if partition_by and partition_by not in schema.names:
+        raise ValueError(f"Cannot partition by {partition_by!r}; expected one of {', '.join(schema.names)}")
+    rules_path = resolve_rules_path(rules_path)
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Scoring {input_path} into {output_dir} with {workers} workers "
+                f"(batches of {batch_size} rows, columns {columns})")
+
+    merged = {'rows': 0, 'scored': 0, 'flags': Counter(), 'parts': 0}
+
+    def collect(stats):
+        merged['rows'] += stats['rows']
+        merged['scored'] += stats['scored']
+        merged['flags'].update(stats['flags'])
+        merged['parts'] += 1
+        logger.info(f"Part {merged['parts']}: {stats['rows']} proposals in {stats['seconds']:.2f}s ({merged['rows']} so far)")
+
+    prepare_output_dir(output_dir, overwrite)
+    # Arrow decodes ahead on its thread pool; cap how far so the queue cannot outgrow the workers
+    batches = dataset.to_batches(columns=columns, batch_size=batch_size, use_threads=True,
+                                 batch_readahead=workers, fragment_readahead=2)
+    if workers == 1:
+        _init_worker(rules_path, explain)
+        for part, batch in enumerate(batches):
+            collect(score_batch(batch, part, schema, output_dir, partition_by))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules_path, explain)) as pool:
+            in_flight = deque()
+            for part, batch in enumerate(batches):
+                # Bound the decoded batches held in memory: wait for the oldest before submitting more
+                if len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft().result())
+                in_flight.append(pool.submit(score_batch, batch, part, schema, output_dir, partition_by))
+            while in_flight:
+                collect(in_flight.popleft().result())
+
+    merged['seconds'] = time.perf_counter() - started
+    rate = merged['rows'] / merged['seconds'] if merged['seconds'] else 0.0
+    logger.info(f"Scored {merged['scored']} of {merged['rows']} proposals in {merged['seconds']:.2f}s "
+                f"({rate:.0f} rows/s); flags: {dict(merged['flags'])}")
+    return merged
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Score a Parquet/CSV dataset out of core into partitioned Parquet")
+    parser.add_argument('input', help="Parquet or CSV file, or a directory of them")
+    parser.add_argument('output_dir', help="where the scored Parquet dataset is written")
+    parser.add_argument('--format', choices=('auto',) + DATASET_FORMATS, default='auto')
+    parser.add_argument('--workers', type=int, default=None, help="scoring processes (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="rows per scored batch and part file")
+    parser.add_argument('--partition-by', default='underwriting_flag',
+                        help="output field to hive-partition by; empty for unpartitioned parts")
+    parser.add_argument('--rules', help="rules YAML (default: FIN_RULES_YAML or the bundled rules)")
+    parser.add_argument('--no-explain', action='store_true', help="leave score_factors empty (null) to score faster")
+    parser.add_argument('--overwrite', action='store_true', help="clear a non-empty output_dir instead of refusing it")
+    args = parser.parse_args(argv)
+
+    stats = score_dataset(args.input, args.output_dir, args.format, args.workers, args.batch_size,
+                          args.partition_by or None, args.rules, 'off' if args.no_explain else None, args.overwrite)
+    if stats['rows'] == 0:
+        logger.warning(f"No rows found in {args.input}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""What-if rescoring of archived finance inputs under candidate rule files.
+
+Loads archived inputs once, either a Parquet/Arrow snapshot or the
+per-proposal inputs archived under ``finance_scores/<date>/`` (per-file or
+packed, see finance_artifact_store; the latest record per proposal wins), computes the SAR/TSAR/Premium ratios once and
+scores them under the baseline rules and every candidate rules file with the
+vectorized compiled rulesets. For each candidate it writes final score,
+risk category and underwriting flag transition matrices (baseline rows x
+candidate columns) as CSV, named after the candidate file (numbered by
+--candidate order when two candidates share a file name), and prints how
+many proposals change.
+
+Usage:
+    python simulate_finance_rules.py --input finance_scores --candidate new_bands.yaml [--candidate ...]
+        [--baseline finance_score_rules.yaml] [--output-dir whatif_out]
+"""
+
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from finance_rules import CompiledRuleset, load_ruleset, resolve_rules_path
+    from finance_score_engine import _guarded_ratio, amount_values
+    from finance_snapshot import FinanceSnapshotSource
+    from finance_artifact_store import FinanceArtifactReader
+except ImportError:
+    from .finance_rules import CompiledRuleset, load_ruleset, resolve_rules_path
+    from .finance_score_engine import _guarded_ratio, amount_values
+    from .finance_snapshot import FinanceSnapshotSource
+    from .finance_artifact_store import FinanceArtifactReader
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+MISSING = 'missing'
+
+
+def load_archived_inputs(path: str) -> pd.DataFrame:
+    """Load a snapshot file, or every archived input record in the dated folders under a directory."""
+    if os.path.isfile(path):
+        return FinanceSnapshotSource(path).extract()
+    day_dirs = sorted({os.path.dirname(found) for pattern in ('inputs', 'packed')
+                       for found in glob.glob(os.path.join(path, '**', pattern), recursive=True)})
+    records = [record for day_dir in day_dirs for record in FinanceArtifactReader(day_dir).iter_records('inputs')]
+    if not records:
+        raise FileNotFoundError(f"No archived finance inputs under {path}")
+    df = pd.DataFrame.from_records(records)
+    # Dated folders sort chronologically, so the last record per proposal is the latest
+    return df.drop_duplicates(subset=['proposal_number', 'proposer_id'], keep='last').reset_index(drop=True)
+
+
+def compute_ratios(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """The three engine ratios for every proposal, computed once for all rule files."""
+    income = amount_values(df, 'annual_income')
+    sum_assured = amount_values(df, 'sum_assured')
+    other_sum_assured = amount_values(df, 'other_insurance_sum_assured')
+    premium = amount_values(df, 'premium')
+    return {
+        'sar_ratio': _guarded_ratio(sum_assured, income),
+        'tsar_ratio': _guarded_ratio(sum_assured + other_sum_assured, income),
+        'premium_ratio': _guarded_ratio(premium, income),
+    }
+
+
+def _codes(values: np.ndarray):
+    """Integer codes into sorted levels, with missing values coded as the last level."""
+    if values.dtype == object:
+        missing = pd.isna(values)
+        codes, levels = pd.factorize(values, sort=True, use_na_sentinel=True)
+        levels = list(levels)
+    else:
+        missing = np.isnan(values)
+        present = np.unique(values[~missing])
+        codes = np.searchsorted(present, values)
+        levels = [int(v) for v in present]
+    codes = np.where(missing, len(levels), codes)
+    return codes, levels + [MISSING]
+
+
+def transition_matrix(before: np.ndarray, after: np.ndarray) -> pd.DataFrame:
+    """Counts of proposals per (baseline value, candidate value) pair.
+
+    Both sides share one set of levels (sorted, 'missing' last) so the
+    diagonal holds the unchanged proposals.
+    """
+    codes, levels = _codes(np.concatenate([before, after]))
+    size = len(levels)
+    n = len(before)
+    counts = np.bincount(codes[:n] * size + codes[n:], minlength=size * size).reshape(size, size)
+    return pd.DataFrame(counts, index=pd.Index(levels, name='baseline'), columns=pd.Index(levels, name='candidate'))
+
+
+def simulate(df: pd.DataFrame, baseline: CompiledRuleset,
+             candidates: List[CompiledRuleset]) -> List[Tuple[str, Dict[str, pd.DataFrame]]]:
+    """Score ``df`` under the baseline and each candidate; return (path, transition matrices) per candidate, in order."""
+    ratios = compute_ratios(df)
+    base = baseline.score_ratios(ratios['sar_ratio'], ratios['tsar_ratio'], ratios['premium_ratio'])
+    results = []
+    for candidate in candidates:
+        scored = candidate.score_ratios(ratios['sar_ratio'], ratios['tsar_ratio'], ratios['premium_ratio'])
+        results.append((candidate.path, {
+            'score': transition_matrix(base['final_finance_score'], scored['final_finance_score']),
+            'category': transition_matrix(base['risk_category'], scored['risk_category']),
+            'flag': transition_matrix(base['underwriting_flag'], scored['underwriting_flag']),
+        }))
+    return results
+
+
+def output_labels(paths: List[str]) -> List[str]:
+    """File name prefix per candidate: its stem, numbered by --candidate order when two share a stem."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    return [stem if stems.count(stem) == 1 else f"{number}_{stem}" for number, stem in enumerate(stems, start=1)]
+
+
+def _changed(matrix: pd.DataFrame) -> int:
+    counts = matrix.to_numpy()
+    return int(counts.sum() - np.trace(counts))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="What-if rescoring of archived finance inputs")
+    parser.add_argument('--input', required=True, help="Parquet/Arrow snapshot, or a directory of archived input JSONs")
+    parser.add_argument('--candidate', action='append', required=True, help="candidate rules YAML (repeatable)")
+    parser.add_argument('--baseline', help="baseline rules YAML (default: FIN_RULES_YAML or the bundled rules)")
+    parser.add_argument('--output-dir', default='whatif_out', help="where transition matrices are written")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    df = load_archived_inputs(args.input)
+    loaded = time.perf_counter()
+    logger.info(f"Loaded {len(df)} archived proposals in {loaded - started:.2f}s")
+
+    baseline = load_ruleset(resolve_rules_path(args.baseline))
+    candidates = [load_ruleset(path) for path in args.candidate]
+    results = simulate(df, baseline, candidates)
+    logger.info(f"Scored {len(df)} proposals under {len(candidates) + 1} rule files in {time.perf_counter() - loaded:.2f}s")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for label, (path, matrices) in zip(output_labels([path for path, _ in results]), results):
+        for kind, matrix in matrices.items():
+            matrix.to_csv(os.path.join(args.output_dir, f"{label}_{kind}_transitions.csv"))
+        print(f"{label} ({path}): score changed for {_changed(matrices['score'])}, "
+              f"category for {_changed(matrices['category'])}, flag for {_changed(matrices['flag'])} of {len(df)} proposals")
+        print(matrices['flag'].to_string())
+    logger.info(f"Transition matrices written to {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,7 @@ import express from 'express';
 import pool from '../config/db.js';
 import { prettyLog } from '../config/logger.js';
 import { compareDocumentData, ensureProcessingResultsTable } from '../utils/documentUtils.js';
+import { scoreWithFinanceWorker } from '../utils/financeScoreWorker.js';
 import axios from 'axios';
 import { spawn } from 'child_process';
 import path from 'path';
@@ -476,8 +477,14 @@ router.get('/finance-score-stored/:proposer_id', async (req, res) => {
   }
 });
 
-// Helper function to calculate finance score using Python script
+// Helper function to calculate finance score using the persistent Python worker
+// (set FINANCE_SCORE_WORKER=false to spawn calculate_single_score.py per request)
 async function calculateFinanceScore(financeData) {
+  if (process.env.FINANCE_SCORE_WORKER !== 'false') {
+    console.debug('[FinanceProcessing][FinanceScore] Scoring with persistent finance score worker');
+    return scoreWithFinanceWorker(financeData);
+  }
+
   return new Promise((resolve, reject) => {
     const pythonScriptPath = path.join(__dirname, '..', 'Rule Engines', 'Finance Score', 'Rule Engine', 'calculate_single_score.py');
     
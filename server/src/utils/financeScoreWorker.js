@@ -0,0 +1,116 @@
+import { spawn } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+import { fileURLToPath } from 'url';
+import { prettyLog } from '../config/logger.js';
+
+// Get current file directory for Python script paths
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+const WORKER_SCRIPT_PATH = path.join(__dirname, '..', 'Rule Engines', 'Finance Score', 'Rule Engine', 'finance_score_worker.py');
+const REQUEST_TIMEOUT_MS = parseInt(process.env.FINANCE_SCORE_TIMEOUT_MS, 10) || 30000;
+
+// One long-lived Python process serves every finance score request (JSON lines over stdin/stdout).
+// Each process tracks its own pending requests, so a dying worker only fails the requests sent to it.
+let workerProcess = null;
+let nextRequestId = 1;
+
+const rejectPending = (pendingRequests, error) => {
+  for (const { reject, timer } of pendingRequests.values()) {
+    clearTimeout(timer);
+    reject(error);
+  }
+  pendingRequests.clear();
+};
+
+const handleWorkerLine = (pendingRequests, line) => {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (parseError) {
+    console.error('[FinanceScoreWorker][Output] Failed to parse worker output:', parseError.message);
+    console.error('[FinanceScoreWorker][Output] Raw output:', line);
+    return;
+  }
+
+  const pending = pendingRequests.get(message.id);
+  if (!pending) {
+    console.warn('[FinanceScoreWorker][Output] Response for unknown request:', message.id);
+    return;
+  }
+  pendingRequests.delete(message.id);
+  clearTimeout(pending.timer);
+
+  if (message.error) {
+    pending.reject(new Error(`Finance score worker error: ${message.error}`));
+  } else {
+    pending.resolve(message.result);
+  }
+};
+
+const startWorker = () => {
+  console.info('[FinanceScoreWorker][Start] Starting finance score worker:', WORKER_SCRIPT_PATH);
+  prettyLog('Starting finance score worker', { script: WORKER_SCRIPT_PATH }, { level: 'info' });
+
+  const child = spawn('python', [WORKER_SCRIPT_PATH], {
+    stdio: ['pipe', 'pipe', 'pipe'],
+    env: process.env,
+  });
+
+  child.pendingRequests = new Map();
+  readline.createInterface({ input: child.stdout }).on('line', (line) => handleWorkerLine(child.pendingRequests, line));
+
+  child.stderr.on('data', (data) => {
+    console.debug('[FinanceScoreWorker][Python]', data.toString().trim());
+  });
+
+  const onStopped = (error) => {
+    if (workerProcess === child) {
+      workerProcess = null;
+    }
+    console.error('[FinanceScoreWorker][Stop] Finance score worker stopped:', error.message);
+    prettyLog('Finance score worker stopped', { error: error.message, pending: child.pendingRequests.size }, { level: 'error' });
+    rejectPending(child.pendingRequests, error);
+  };
+
+  child.on('exit', (code, signal) => {
+    onStopped(new Error(`Finance score worker exited with code ${code}${signal ? ` (signal ${signal})` : ''}`));
+  });
+
+  child.on('error', (error) => {
+    onStopped(new Error(`Finance score worker process error: ${error.message}`));
+  });
+
+  // Writing to a crashed or killed worker fails with EPIPE; unhandled, that would take down the server
+  child.stdin.on('error', (error) => {
+    onStopped(new Error(`Finance score worker stdin error: ${error.message}`));
+    child.kill();
+  });
+
+  return child;
+};
+
+// Score one proposer on the shared worker, starting (or restarting) it on demand
+export const scoreWithFinanceWorker = (financeData) => new Promise((resolve, reject) => {
+  if (!workerProcess) {
+    workerProcess = startWorker();
+  }
+  const worker = workerProcess;
+
+  const id = nextRequestId++;
+  const timer = setTimeout(() => {
+    worker.pendingRequests.delete(id);
+    console.error('[FinanceScoreWorker][Timeout] Finance score request timed out:', { id, timeout_ms: REQUEST_TIMEOUT_MS });
+    reject(new Error(`Finance score worker timed out after ${REQUEST_TIMEOUT_MS} ms`));
+    // A stuck worker cannot serve anything else: detach it now so requests arriving before
+    // its 'exit' start a fresh one, then kill it (its 'exit' fails its other pending requests)
+    if (workerProcess === worker) {
+      workerProcess = null;
+    }
+    worker.kill();
+  }, REQUEST_TIMEOUT_MS);
+
+  worker.pendingRequests.set(id, { resolve, reject, timer });
+  worker.stdin.write(`${JSON.stringify({ id, finance_data: financeData })}\n`);
+});